@@ -9,7 +9,7 @@ a = Analysis(
     datas=[
         ('src/.env', '.env'),
     ],
-    hiddenimports=['aiosqlite', 'sqlalchemy.ext.asyncio', 'sqlalchemy.dialects.sqlite'],
+    hiddenimports=['aiosqlite', 'sqlalchemy.ext.asyncio', 'sqlalchemy.dialects.sqlite', 'tiktoken_ext', 'tiktoken_ext.openai_public'],
     hookspath=[],
     runtime_hooks=[],
     excludes=[],
@@ -1,31 +1,242 @@
+import json
+import re
+import time
+import unicodedata
+from collections import Counter
 from typing import List
 from sqlalchemy import (
     Column,
     Integer,
+    Boolean,
     String,
     Text,
     DateTime,
     ForeignKey,
     SmallInteger,
+    Float,
+    Index,
+    LargeBinary,
     create_engine,
+    func,
+    inspect,
+    insert,
     text,
 )
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, relationship, joinedload
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker, relationship, joinedload, deferred, raiseload
 from datetime import datetime
 from sqlalchemy.future import select
+from dcCache import content_hash
+from dcContentStore import ContentCodec
 
 Base = declarative_base()
+# Compresión del almacén de contenidos; init_db le carga los diccionarios guardados
+content_codec = ContentCodec()
 
 
-async def init_db(engine_url="sqlite+aiosqlite:///app.db"):
-    engine = create_async_engine(engine_url, echo=False)  # Set echo to False
+# Perfiles de almacenamiento: PRAGMAs que se aplican a cada conexión nueva
+STORAGE_PROFILES = {
+    # WAL: los lectores (Históricos, BatchView) no se bloquean mientras un batch escribe
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",  # En WAL no corrompe; sólo puede perder la última transacción ante un corte
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,  # En KiB (negativo): 64 MiB
+        "busy_timeout": 10000,
+        "temp_store": "MEMORY",
+    },
+    # Como "wal" pero con fsync en cada commit
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -16 * 1024,
+        "busy_timeout": 10000,
+    },
+    # Valores por defecto de SQLite (diario de rollback)
+    "default": {},
+}
+
+
+def _pragmas_listener(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for nombre, valor in pragmas.items():
+            cursor.execute(f"PRAGMA {nombre}={valor}")
+        cursor.close()
+
+    return on_connect
+
+
+async def init_db(engine_url="sqlite+aiosqlite:///app.db", profile="wal"):
+    """
+    Crea el engine, las tablas y actualiza el esquema de bases existentes.
+
+    Usa NullPool: cada sesión abre su propia conexión en el loop que la usa.
+    Las conexiones de aiosqlite quedan atadas al loop donde se crearon, y la
+    app usa varios (el hilo de BatchConsole y los `asyncio.run` de la GUI).
+    En SQLite abrir una conexión es barato.
+
+    Args:
+        engine_url (str): URL de la base.
+        profile (str | dict): Nombre de un perfil de STORAGE_PROFILES o un dict de PRAGMAs.
+    """
+    pragmas = STORAGE_PROFILES[profile] if isinstance(profile, str) else profile
+    engine = create_async_engine(engine_url, echo=False, poolclass=NullPool)  # Set echo to False
+    if pragmas:
+        event.listen(engine.sync_engine, "connect", _pragmas_listener(pragmas))
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        agregadas, eliminadas = await conn.run_sync(upgrade_schema)
+        # Borrar repetidas deja desactualizados los contadores del resumen
+        if "batch.estado" in agregadas or eliminadas:
+            await conn.run_sync(backfill_batch_summary)
+        await conn.run_sync(_cargar_diccionarios)
+        await conn.run_sync(create_search_index)
     return engine
 
 
+def _cargar_diccionarios(conn):
+    filas = conn.execute(select(ContenidoDiccionario.id, ContenidoDiccionario.datos)
+                         .order_by(ContenidoDiccionario.id)).all()
+    for i, (diccionario_id, datos) in enumerate(filas):
+        content_codec.cargar_diccionario(diccionario_id, datos, usar=i == len(filas) - 1)
+
+
+def upgrade_schema(conn):
+    """
+    Agrega a las tablas existentes las columnas e índices nuevos del modelo.
+
+    `create_all` sólo crea tablas faltantes; las bases creadas con versiones
+    anteriores se actualizan aquí con ALTER TABLE ... ADD COLUMN y CREATE INDEX.
+
+    Returns:
+        tuple: (agregadas, eliminadas): el set de columnas agregadas, como
+            "tabla.columna", y un dict tabla -> filas repetidas eliminadas.
+    """
+    agregadas = set()
+    eliminadas = {}
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existentes = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existentes:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT {column.server_default.arg}"
+            conn.execute(text(ddl))
+            agregadas.add(f"{table.name}.{column.name}")
+
+        # Índices nuevos; antes de un índice único se eliminan las filas repetidas
+        indices = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in indices:
+                continue
+            if index.unique:
+                columnas = ", ".join(c.name for c in index.columns)
+                borradas = conn.execute(text(
+                    f"DELETE FROM {table.name} WHERE id NOT IN "
+                    f"(SELECT MIN(id) FROM {table.name} GROUP BY {columnas})"
+                )).rowcount
+                if borradas:
+                    eliminadas[table.name] = eliminadas.get(table.name, 0) + borradas
+                    print(
+                        f"Se eliminaron {borradas} filas repetidas de {table.name} "
+                        f"(se conserva la primera por {columnas}) para crear {index.name}."
+                    )
+            index.create(conn, checkfirst=True)
+    return agregadas, eliminadas
+
+
+def backfill_batch_summary(conn):
+    """Calcula desde los hijos el resumen de los batches creados antes de mantenerlo."""
+    conn.execute(text("""
+        UPDATE batch SET
+            sitios_rastreados = (SELECT COUNT(*) FROM batch_site s WHERE s.batch_id = batch.id),
+            respuestas = (SELECT COUNT(*) FROM batch_prompt_response r WHERE r.batch_id = batch.id),
+            sitios_analizados = (
+                SELECT COUNT(*) FROM (
+                    SELECT r.batch_site_id FROM batch_prompt_response r
+                    WHERE r.batch_id = batch.id
+                    GROUP BY r.batch_site_id
+                    HAVING COUNT(*) >= (SELECT COUNT(*) FROM batch_prompt p WHERE p.batch_id = batch.id)
+                )
+            ),
+            estado = CASE WHEN fecha_terminado IS NOT NULL THEN 'completado' ELSE 'pendiente' END,
+            duracion = CASE WHEN fecha_terminado IS NOT NULL
+                THEN (julianday(fecha_terminado) - julianday(fecha_creado)) * 86400 ELSE 0 END
+    """))
+
+
+# Índices de búsqueda de texto completo (FTS5). Los textos rastreados se
+# guardan comprimidos, así que su índice no guarda contenido (content=''):
+# create_batch_sites indexa cada sitio con rowid = batch_site.id y los
+# fragmentos se arman al leer el texto. Las respuestas se indexan con
+# triggers sobre batch_prompt_response, que es su tabla de contenido externa.
+TOKENIZADOR_BUSQUEDA = "unicode61 remove_diacritics 2"
+SEARCH_DDL = {
+    "busqueda_sitio": "CREATE VIRTUAL TABLE busqueda_sitio USING fts5("
+    f"texto, content='', tokenize='{TOKENIZADOR_BUSQUEDA}')",
+    "busqueda_respuesta": "CREATE VIRTUAL TABLE busqueda_respuesta USING fts5("
+    "respuesta, content='batch_prompt_response', content_rowid='id', "
+    f"tokenize='{TOKENIZADOR_BUSQUEDA}')",
+    "busqueda_respuesta_ai": "CREATE TRIGGER busqueda_respuesta_ai AFTER INSERT ON batch_prompt_response BEGIN "
+    "INSERT INTO busqueda_respuesta(rowid, respuesta) VALUES (new.id, new.respuesta); END",
+    "busqueda_respuesta_ad": "CREATE TRIGGER busqueda_respuesta_ad AFTER DELETE ON batch_prompt_response BEGIN "
+    "INSERT INTO busqueda_respuesta(busqueda_respuesta, rowid, respuesta) "
+    "VALUES ('delete', old.id, old.respuesta); END",
+    "busqueda_respuesta_au": "CREATE TRIGGER busqueda_respuesta_au AFTER UPDATE OF respuesta "
+    "ON batch_prompt_response BEGIN "
+    "INSERT INTO busqueda_respuesta(busqueda_respuesta, rowid, respuesta) "
+    "VALUES ('delete', old.id, old.respuesta); "
+    "INSERT INTO busqueda_respuesta(rowid, respuesta) VALUES (new.id, new.respuesta); END",
+}
+
+
+def create_search_index(conn, lote=200):
+    """Crea los índices de búsqueda si faltan e indexa lo que ya estaba guardado."""
+    existentes = set(conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE name LIKE 'busqueda_%'"
+    )).scalars())
+    for nombre, ddl in SEARCH_DDL.items():
+        if nombre not in existentes:
+            conn.execute(text(ddl))
+    if "busqueda_respuesta" not in existentes:
+        conn.execute(text("INSERT INTO busqueda_respuesta(busqueda_respuesta) VALUES ('rebuild')"))
+    if "busqueda_sitio" not in existentes:
+        ultimo = 0
+        while True:
+            filas = conn.execute(
+                select(BatchSite.id, BatchSite.contenido, Contenido.codec, Contenido.diccionario_id, Contenido.datos)
+                .outerjoin(Contenido, Contenido.hash == BatchSite.texto_hash)
+                .where(BatchSite.id > ultimo)
+                .order_by(BatchSite.id)
+                .limit(lote)
+            ).all()
+            if not filas:
+                break
+            textos = {
+                site_id: content_codec.decompress(codec, diccionario_id, datos) if datos is not None else contenido
+                for site_id, contenido, codec, diccionario_id, datos in filas
+            }
+            filas_indice = _filas_indice(textos)
+            if filas_indice:
+                conn.execute(INDEXAR_SITIO, filas_indice)
+            ultimo = filas[-1][0]
+
+
+INDEXAR_SITIO = text("INSERT INTO busqueda_sitio(rowid, texto) VALUES (:rowid, :texto)")
+
+
+def _filas_indice(textos):
+    """Parámetros de INDEXAR_SITIO para un dict id del sitio -> texto (se omiten los vacíos)."""
+    return [{"rowid": site_id, "texto": texto} for site_id, texto in textos.items() if texto]
+
+
 # Definición de las entidades
 class Batch(Base):
     __tablename__ = "batch"
@@ -37,6 +248,19 @@ class Batch(Base):
     profundidad = Column(SmallInteger, nullable=True)
     sitios = Column(SmallInteger, nullable=True)
     caracteres = Column(SmallInteger, nullable=True)
+    # Totales de las consultas al modelo (todas las ejecuciones del batch)
+    consultas = Column(Integer, nullable=False, default=0, server_default="0")
+    tokens_prompt = Column(Integer, nullable=False, default=0, server_default="0")
+    tokens_cached = Column(Integer, nullable=False, default=0, server_default="0")
+    tokens_completion = Column(Integer, nullable=False, default=0, server_default="0")
+    segundos_analisis = Column(Float, nullable=False, default=0, server_default="0")
+    # Resumen mantenido por el pipeline para listar el histórico sin leer los hijos
+    estado = Column(String(20), nullable=False, default="pendiente", server_default=text("'pendiente'"))
+    sitios_rastreados = Column(Integer, nullable=False, default=0, server_default="0")
+    sitios_analizados = Column(Integer, nullable=False, default=0, server_default="0")  # Con todas sus respuestas
+    respuestas = Column(Integer, nullable=False, default=0, server_default="0")
+    errores = Column(Integer, nullable=False, default=0, server_default="0")  # Consultas fallidas de la última ejecución
+    duracion = Column(Float, nullable=False, default=0, server_default="0")  # Segundos de ejecución, sumando reanudaciones
 
     batch_sites = relationship("BatchSite", back_populates="batch")
     batch_prompts = relationship("BatchPrompt", back_populates="batch")
@@ -47,20 +271,50 @@ class BatchSite(Base):
     __tablename__ = "batch_site"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    batch_id = Column(Integer, ForeignKey("batch.id"), nullable=False)
+    batch_id = Column(Integer, ForeignKey("batch.id"), nullable=False, index=True)
     url = Column(String(2048), nullable=False)
-    contenido = Column(Text, nullable=True)
+    # Texto sin comprimir de versiones anteriores; los sitios nuevos usan texto_hash
+    contenido = deferred(Column(Text, nullable=True))
+    # Texto en el almacén comprimido (tabla contenido); se lee con get_site_texts
+    texto_hash = Column(String(64), ForeignKey("contenido.hash"), nullable=True, index=True)
     fecha_creado = Column(DateTime, default=datetime.utcnow, nullable=False)
+    hash_contenido = Column(String(64), nullable=True)
+    # Sitio del mismo batch con contenido (casi) idéntico cuyas respuestas se reutilizan
+    duplicado_de = Column(Integer, ForeignKey("batch_site.id"), nullable=True)
 
     batch = relationship("Batch", back_populates="batch_sites")
     responses = relationship("BatchPromptResponse", back_populates="batch_site")
 
 
+class Contenido(Base):
+    """Texto rastreado, comprimido y guardado una sola vez por hash sha256."""
+
+    __tablename__ = "contenido"
+
+    hash = Column(String(64), primary_key=True)
+    codec = Column(String(10), nullable=False)
+    diccionario_id = Column(Integer, ForeignKey("contenido_diccionario.id"), nullable=True)
+    largo = Column(Integer, nullable=False)  # Caracteres del texto sin comprimir
+    datos = deferred(Column(LargeBinary, nullable=False))
+    fecha_creado = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ContenidoDiccionario(Base):
+    """Diccionario zstd entrenado sobre el corpus; el más reciente es el que se usa al comprimir."""
+
+    __tablename__ = "contenido_diccionario"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    datos = Column(LargeBinary, nullable=False)
+    muestras = Column(Integer, nullable=False)
+    fecha_creado = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class BatchPrompt(Base):
     __tablename__ = "batch_prompt"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    batch_id = Column(Integer, ForeignKey("batch.id"), nullable=False)
+    batch_id = Column(Integer, ForeignKey("batch.id"), nullable=False, index=True)
     prompt = Column(String(2048), nullable=False)
 
     batch = relationship("Batch", back_populates="batch_prompts")
@@ -69,18 +323,40 @@ class BatchPrompt(Base):
 
 class BatchPromptResponse(Base):
     __tablename__ = "batch_prompt_response"
+    # Una respuesta por par sitio/prompt; el índice también sirve para buscar por sitio
+    __table_args__ = (
+        Index("ux_batch_prompt_response_site_prompt", "batch_site_id", "batch_prompt_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    batch_id = Column(Integer, ForeignKey("batch.id"), nullable=False)
+    batch_id = Column(Integer, ForeignKey("batch.id"), nullable=False, index=True)
     batch_site_id = Column(Integer, ForeignKey("batch_site.id"), nullable=False)
-    batch_prompt_id = Column(Integer, ForeignKey("batch_prompt.id"), nullable=False)
+    batch_prompt_id = Column(Integer, ForeignKey("batch_prompt.id"), nullable=False, index=True)
     respuesta = Column(Text, nullable=False)
     fecha_creado = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Costo de la respuesta: cero si vino de la caché o de un sitio duplicado
+    modelo = Column(String(50), nullable=True)
+    tokens_prompt = Column(Integer, nullable=False, default=0, server_default="0")
+    tokens_cached = Column(Integer, nullable=False, default=0, server_default="0")
+    tokens_completion = Column(Integer, nullable=False, default=0, server_default="0")
+    latencia = Column(Float, nullable=True)  # Segundos de reloj hasta obtener la respuesta
+    # Error no reintentable del modelo (p. ej. contexto excedido): `respuesta` tiene el mensaje
+    error = Column(Boolean, nullable=False, default=False, server_default="0")
 
     batch_site = relationship("BatchSite", back_populates="responses")
     batch_prompt = relationship("BatchPrompt", back_populates="responses")
 
 
+class BatchCheckpoint(Base):
+    __tablename__ = "batch_checkpoint"
+
+    batch_id = Column(Integer, ForeignKey("batch.id"), primary_key=True)
+    # Fase del pipeline: "crawl", "contenido", "analisis" o "terminado"
+    fase = Column(String(20), nullable=False)
+    estado = Column(Text, nullable=True)  # Estado del crawler serializado en JSON
+    fecha_actualizado = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 # Funciones para manejar cada entidad de manera asíncrona
 async def create_batch(
     session, url_inicial, profundidad=None, sitios=None, caracteres=None
@@ -99,9 +375,23 @@ async def create_batch(
     return batch
 
 
-async def create_batch_site(session, batch_id, url, contenido=None):
-    batch_site = BatchSite(batch_id=batch_id, url=url, contenido=contenido)
+async def create_batch_site(
+    session, batch_id, url, contenido=None, hash_contenido=None, duplicado_de=None
+):
+    texto_hash, = await put_contents(session, [contenido])
+    batch_site = BatchSite(
+        batch_id=batch_id,
+        url=url,
+        texto_hash=texto_hash,
+        hash_contenido=hash_contenido,
+        duplicado_de=duplicado_de,
+    )
     session.add(batch_site)
+    await session.flush()
+    filas_indice = _filas_indice({batch_site.id: contenido})
+    if filas_indice:
+        await session.execute(INDEXAR_SITIO, filas_indice)
+    await _sumar_sitios(session, batch_id, 1)
     await session.commit()
     await session.refresh(batch_site)
     return batch_site
@@ -116,30 +406,395 @@ async def create_batch_prompt(session, batch_id, prompt):
 
 
 async def create_batch_prompt_response(
-    session, batch_id, batch_site_id, batch_prompt_id, respuesta
+    session, batch_id, batch_site_id, batch_prompt_id, respuesta,
+    modelo=None, tokens_prompt=0, tokens_cached=0, tokens_completion=0, latencia=None
 ):
     response = BatchPromptResponse(
         batch_id=batch_id,
         batch_site_id=batch_site_id,
         batch_prompt_id=batch_prompt_id,
         respuesta=respuesta,
+        modelo=modelo,
+        tokens_prompt=tokens_prompt,
+        tokens_cached=tokens_cached,
+        tokens_completion=tokens_completion,
+        latencia=latencia,
     )
     session.add(response)
+    await session.flush()
+    await _sumar_respuestas(session, batch_id, [batch_site_id])
     await session.commit()
     await session.refresh(response)
     return response
 
 
+async def _insert_many(session, model, filas, commit=True):
+    """Inserta muchas filas en una sola sentencia y transacción; devuelve los ids en el mismo orden."""
+    if not filas:
+        return []
+    result = await session.scalars(
+        insert(model).returning(model.id, sort_by_parameter_order=True), filas
+    )
+    ids = list(result)
+    if commit:
+        await session.commit()
+    return ids
+
+
+async def create_batch_sites(session, batch_id, sites):
+    """
+    Crea muchos sitios en una transacción.
+
+    Args:
+        sites (iterable): Dicts con `url` y opcionalmente `contenido`,
+            `hash_contenido` y `duplicado_de`.
+
+    Returns:
+        list: Los ids de los sitios, en el orden recibido.
+    """
+    sites = list(sites)
+    hashes = await put_contents(session, [site.get("contenido") for site in sites])
+    ahora = datetime.utcnow()
+    ids = await _insert_many(
+        session, BatchSite,
+        [
+            {
+                "batch_id": batch_id,
+                "fecha_creado": ahora,
+                "texto_hash": texto_hash,
+                **{k: v for k, v in site.items() if k != "contenido"},
+            }
+            for site, texto_hash in zip(sites, hashes)
+        ],
+        commit=False,
+    )
+    # El texto se indexa en la misma transacción que el sitio
+    filas_indice = _filas_indice({site_id: site.get("contenido") for site_id, site in zip(ids, sites)})
+    if filas_indice:
+        await session.execute(INDEXAR_SITIO, filas_indice)
+    await _sumar_sitios(session, batch_id, len(ids))
+    await session.commit()
+    return ids
+
+
+def _lotes(valores, tamanio=500):
+    valores = list(valores)
+    return (valores[i:i + tamanio] for i in range(0, len(valores), tamanio))
+
+
+async def put_contents(session, textos):
+    """
+    Guarda textos en el almacén comprimido, una sola vez por hash (no hace commit).
+
+    Returns:
+        list: El hash de cada texto, en el orden recibido (None para los textos None).
+    """
+    hashes = [content_hash(t) if t is not None else None for t in textos]
+    nuevos = {h: t for h, t in zip(hashes, textos) if h is not None}
+    for lote in _lotes(nuevos):
+        existentes = await session.scalars(select(Contenido.hash).where(Contenido.hash.in_(lote)))
+        for h in existentes:
+            del nuevos[h]
+    filas = []
+    ahora = datetime.utcnow()
+    for h, texto in nuevos.items():
+        codec, diccionario_id, datos = content_codec.compress(texto)
+        filas.append({
+            "hash": h, "codec": codec, "diccionario_id": diccionario_id,
+            "largo": len(texto), "datos": datos, "fecha_creado": ahora,
+        })
+    if filas:
+        await session.execute(sqlite_insert(Contenido).on_conflict_do_nothing(), filas)
+    return hashes
+
+
+async def get_contents(session, hashes):
+    """Textos descomprimidos del almacén: dict hash -> texto."""
+    textos = {}
+    for lote in _lotes({h for h in hashes if h is not None}):
+        filas = await session.execute(
+            select(Contenido.hash, Contenido.codec, Contenido.diccionario_id, Contenido.datos)
+            .where(Contenido.hash.in_(lote))
+        )
+        for h, codec, diccionario_id, datos in filas:
+            textos[h] = content_codec.decompress(codec, diccionario_id, datos)
+    return textos
+
+
+async def get_site_texts(session, sites):
+    """
+    Texto de cada sitio, leído (y descomprimido) sólo cuando hace falta.
+
+    Returns:
+        dict: id del sitio -> texto (None si el sitio no tiene contenido).
+    """
+    sites = list(sites)
+    textos = await get_contents(session, (site.texto_hash for site in sites))
+    resultado = {site.id: textos.get(site.texto_hash) for site in sites}
+    # Sitios de versiones anteriores con el texto sin comprimir en batch_site.contenido
+    anteriores = [site.id for site in sites if site.texto_hash is None]
+    for lote in _lotes(anteriores):
+        filas = await session.execute(
+            select(BatchSite.id, BatchSite.contenido).where(BatchSite.id.in_(lote))
+        )
+        resultado.update(dict(filas.all()))
+    return resultado
+
+
+async def migrate_site_contents(session, lote=200):
+    """
+    Pasa al almacén comprimido el texto de los sitios de versiones anteriores.
+
+    Returns:
+        int: Cantidad de sitios migrados.
+    """
+    total = 0
+    while True:
+        filas = (await session.execute(
+            select(BatchSite.id, BatchSite.contenido)
+            .where(BatchSite.contenido.is_not(None), BatchSite.texto_hash.is_(None))
+            .limit(lote)
+        )).all()
+        if not filas:
+            return total
+        hashes = await put_contents(session, [contenido for _, contenido in filas])
+        for (site_id, _), texto_hash in zip(filas, hashes):
+            await session.execute(
+                BatchSite.__table__.update()
+                .where(BatchSite.id == site_id)
+                .values(texto_hash=texto_hash, contenido=None)
+            )
+        await session.commit()
+        total += len(filas)
+
+
+async def train_content_dictionary(session, muestras=2000, tamanio=112640):
+    """
+    Entrena un diccionario zstd con una muestra del almacén y lo usa para los textos nuevos.
+
+    Returns:
+        int: Id del diccionario, o None si no hay zstd o no alcanzan las muestras.
+    """
+    hashes = (await session.scalars(
+        select(Contenido.hash).order_by(text("RANDOM()")).limit(muestras)
+    )).all()
+    datos = content_codec.train(list((await get_contents(session, hashes)).values()), tamanio)
+    if datos is None:
+        return None
+    diccionario = ContenidoDiccionario(datos=datos, muestras=len(hashes))
+    session.add(diccionario)
+    await session.commit()
+    content_codec.cargar_diccionario(diccionario.id, datos)
+    return diccionario.id
+
+
+async def recompress_contents(session, lote=200):
+    """
+    Vuelve a comprimir con el codec y diccionario actuales los textos guardados con otros.
+
+    Returns:
+        int: Cantidad de textos recomprimidos.
+    """
+    codec_actual, diccionario_actual, _ = content_codec.compress("")
+    condicion = (Contenido.codec != codec_actual) | Contenido.diccionario_id.is_distinct_from(diccionario_actual)
+    total = 0
+    while True:
+        hashes = (await session.scalars(select(Contenido.hash).where(condicion).limit(lote))).all()
+        if not hashes:
+            return total
+        for h, texto in (await get_contents(session, hashes)).items():
+            codec, diccionario_id, datos = content_codec.compress(texto)
+            await session.execute(
+                Contenido.__table__.update()
+                .where(Contenido.hash == h)
+                .values(codec=codec, diccionario_id=diccionario_id, datos=datos)
+            )
+        await session.commit()
+        total += len(hashes)
+
+
+async def create_batch_prompts(session, batch_id, prompts):
+    """Crea muchos prompts en una transacción; devuelve sus ids en el orden recibido."""
+    return await _insert_many(
+        session, BatchPrompt, [{"batch_id": batch_id, "prompt": prompt} for prompt in prompts]
+    )
+
+
+async def create_batch_prompt_responses(session, batch_id, responses):
+    """
+    Crea muchas respuestas en una transacción.
+
+    Args:
+        responses (iterable): Dicts con `batch_site_id`, `batch_prompt_id`,
+            `respuesta` y opcionalmente el uso (`modelo`, `tokens_*`, `latencia`)
+            y `error`.
+
+    Returns:
+        list: Los ids de las respuestas, en el orden recibido.
+    """
+    responses = list(responses)
+    ahora = datetime.utcnow()
+    ids = await _insert_many(
+        session, BatchPromptResponse,
+        [{"batch_id": batch_id, "fecha_creado": ahora, **response} for response in responses],
+        commit=False,
+    )
+    await _sumar_respuestas(session, batch_id, [response["batch_site_id"] for response in responses])
+    await session.commit()
+    return ids
+
+
+async def _sumar_sitios(session, batch_id, cantidad):
+    """Suma al resumen del batch los sitios recién insertados (no hace commit)."""
+    if cantidad:
+        await session.execute(
+            Batch.__table__.update()
+            .where(Batch.id == batch_id)
+            .values(sitios_rastreados=Batch.sitios_rastreados + cantidad)
+        )
+
+
+async def _sumar_respuestas(session, batch_id, site_ids):
+    """
+    Suma al resumen del batch las respuestas recién insertadas (no hace commit).
+
+    Un sitio pasa a analizado cuando la inserción completa una respuesta por prompt.
+    """
+    if not site_ids:
+        return
+    nuevas = Counter(site_ids)
+    prompts = await session.scalar(
+        select(func.count()).select_from(BatchPrompt).where(BatchPrompt.batch_id == batch_id)
+    )
+    completos = 0
+    for lote in _lotes(nuevas):
+        totales = await session.execute(
+            select(BatchPromptResponse.batch_site_id, func.count())
+            .where(BatchPromptResponse.batch_site_id.in_(lote))
+            .group_by(BatchPromptResponse.batch_site_id)
+        )
+        completos += sum(1 for site_id, total in totales if total - nuevas[site_id] < prompts <= total)
+    await session.execute(
+        Batch.__table__.update()
+        .where(Batch.id == batch_id)
+        .values(
+            respuestas=Batch.respuestas + len(site_ids),
+            sitios_analizados=Batch.sitios_analizados + completos,
+        )
+    )
+
+
+class FilaPendiente:
+    """Fila encolada en un BatchWriter; `id` se completa cuando se inserta."""
+
+    def __init__(self, campos):
+        self.campos = campos
+        self.id = None
+
+
+class BatchWriter:
+    """
+    Escritor con buffer para los sitios y respuestas de un batch.
+
+    Acumula filas y las inserta en bloque (una transacción por tabla) cada
+    `max_rows` filas o cuando pasaron `max_seconds` desde la última escritura
+    (se controla al encolar). Al salir del `async with` escribe lo pendiente,
+    también si la tarea se canceló.
+
+    Un sitio puede marcarse `duplicado_de` otro todavía encolado: se escribe
+    el buffer antes para conocer su id.
+    """
+
+    def __init__(self, session, batch_id, max_rows=50, max_seconds=2.0):
+        self.session = session
+        self.batch_id = batch_id
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self._sites = []
+        self._responses = []
+        self._ultimo = time.monotonic()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            # Una excepción a mitad de un flush deja la sesión pendiente de rollback
+            await self.session.rollback()
+        await self.flush()
+
+    def __len__(self):
+        return len(self._sites) + len(self._responses)
+
+    async def add_site(self, url, contenido=None, hash_contenido=None, duplicado_de=None):
+        """Encola un sitio. `duplicado_de` puede ser un id o una FilaPendiente."""
+        if isinstance(duplicado_de, FilaPendiente) and duplicado_de.id is None:
+            await self.flush()
+        fila = FilaPendiente({
+            "url": url,
+            "contenido": contenido,
+            "hash_contenido": hash_contenido,
+            "duplicado_de": duplicado_de,
+        })
+        self._sites.append(fila)
+        await self._flush_si_corresponde()
+        return fila
+
+    async def add_response(self, batch_site_id, batch_prompt_id, respuesta, error=False, **uso):
+        """
+        Encola una respuesta; `uso` son las columnas de costo (`modelo`, `tokens_*`, `latencia`).
+        Con `error`, `respuesta` es el mensaje de un error no reintentable del modelo.
+        """
+        fila = FilaPendiente({
+            "batch_site_id": batch_site_id,
+            "batch_prompt_id": batch_prompt_id,
+            "respuesta": respuesta,
+            "error": error,
+            **uso,
+        })
+        self._responses.append(fila)
+        await self._flush_si_corresponde()
+        return fila
+
+    async def _flush_si_corresponde(self):
+        if len(self) >= self.max_rows or time.monotonic() - self._ultimo >= self.max_seconds:
+            await self.flush()
+
+    async def flush(self):
+        """Inserta todo lo encolado."""
+        self._ultimo = time.monotonic()
+        if self._sites:
+            sites, self._sites = self._sites, []
+            for fila in sites:
+                duplicado_de = fila.campos["duplicado_de"]
+                if isinstance(duplicado_de, FilaPendiente):
+                    fila.campos["duplicado_de"] = duplicado_de.id
+            ids = await create_batch_sites(self.session, self.batch_id, [f.campos for f in sites])
+            for fila, fila_id in zip(sites, ids):
+                fila.id = fila_id
+        if self._responses:
+            responses, self._responses = self._responses, []
+            ids = await create_batch_prompt_responses(
+                self.session, self.batch_id, [f.campos for f in responses]
+            )
+            for fila, fila_id in zip(responses, ids):
+                fila.id = fila_id
+
+
 async def get_batches(session):
     result = await session.execute(select(Batch))
     return result.scalars().all()
 
 
 async def get_batch(session, batch_id, eager: bool = False):
+    """
+    Un batch; con `eager` también sus prompts. Los sitios no se cargan con el
+    batch (pueden ser miles): se leen de a páginas con get_batch_sites_page.
+    """
     if eager:
         result = await session.execute(
             select(Batch)
-            .options(joinedload(Batch.batch_sites), joinedload(Batch.batch_prompts))
+            .options(raiseload(Batch.batch_sites), joinedload(Batch.batch_prompts))
             .filter(Batch.id == batch_id)
         )
         return result.unique().scalars().one()
@@ -176,6 +831,159 @@ async def get_batch_responses(session, batch_id):
     return result.scalars().all()
 
 
+# Columnas de las consultas paginadas; el texto largo sólo se lee si se pide.
+# El texto de los sitios está en el almacén: se lee por página con get_site_texts.
+COLUMNAS_BATCH = (
+    Batch.id, Batch.url_inicial, Batch.fecha_creado, Batch.fecha_terminado,
+    Batch.profundidad, Batch.sitios, Batch.caracteres,
+    Batch.estado, Batch.sitios_rastreados, Batch.sitios_analizados,
+    Batch.respuestas, Batch.errores, Batch.duracion,
+)
+COLUMNAS_SITIO = (
+    BatchSite.id, BatchSite.batch_id, BatchSite.url, BatchSite.texto_hash,
+    BatchSite.hash_contenido, BatchSite.duplicado_de, BatchSite.fecha_creado,
+)
+COLUMNAS_RESPUESTA = (
+    BatchPromptResponse.id, BatchPromptResponse.batch_id, BatchPromptResponse.batch_site_id,
+    BatchPromptResponse.batch_prompt_id, BatchPromptResponse.fecha_creado, BatchPromptResponse.modelo,
+    BatchPromptResponse.tokens_prompt, BatchPromptResponse.tokens_cached,
+    BatchPromptResponse.tokens_completion, BatchPromptResponse.latencia, BatchPromptResponse.error,
+)
+
+
+async def get_page(session, model, columnas, *filtros, after_id=None, limit=200, descending=False):
+    """
+    Una página de filas paginada por keyset sobre el id: cuesta lo mismo en
+    cualquier página (no usa OFFSET) y no se saltea ni repite filas si se
+    insertan otras mientras se recorre.
+
+    Args:
+        model: Entidad cuyo id ordena las filas.
+        columnas (tuple): Columnas a leer; tiene que incluir el id.
+        filtros: Condiciones del WHERE.
+        after_id (int): Id de la última fila de la página anterior (None para la primera).
+        limit (int): Filas por página.
+        descending (bool): Del id más alto al más bajo.
+
+    Returns:
+        list: Filas (Row, con acceso por atributo); la próxima página sigue desde `filas[-1].id`.
+    """
+    stmt = select(*columnas).where(*filtros)
+    if after_id is not None:
+        stmt = stmt.where(model.id < after_id if descending else model.id > after_id)
+    stmt = stmt.order_by(model.id.desc() if descending else model.id).limit(limit)
+    return (await session.execute(stmt)).all()
+
+
+async def stream_rows(session, model, columnas, *filtros, page_size=500, descending=False):
+    """Recorre todas las filas de a una, leyendo de a `page_size` (ver get_page)."""
+    after_id = None
+    while True:
+        filas = await get_page(
+            session, model, columnas, *filtros, after_id=after_id, limit=page_size, descending=descending
+        )
+        for fila in filas:
+            yield fila
+        if len(filas) < page_size:
+            return
+        after_id = filas[-1].id
+
+
+async def get_batches_page(session, before_id=None, limit=100):
+    """Página de batches, del más nuevo al más viejo; la siguiente empieza antes de `filas[-1].id`."""
+    return await get_page(session, Batch, COLUMNAS_BATCH, after_id=before_id, limit=limit, descending=True)
+
+
+async def get_batch_sites_page(session, batch_id, after_id=None, limit=200):
+    """Página de sitios del batch, sin el texto."""
+    return await get_page(
+        session, BatchSite, COLUMNAS_SITIO, BatchSite.batch_id == batch_id, after_id=after_id, limit=limit
+    )
+
+
+def _columnas_respuesta(with_text):
+    return COLUMNAS_RESPUESTA + (BatchPromptResponse.respuesta,) if with_text else COLUMNAS_RESPUESTA
+
+
+async def get_batch_responses_page(session, batch_id, after_id=None, limit=200, with_text=False):
+    """Página de respuestas del batch; el texto de la respuesta sólo con `with_text`."""
+    return await get_page(
+        session, BatchPromptResponse, _columnas_respuesta(with_text),
+        BatchPromptResponse.batch_id == batch_id, after_id=after_id, limit=limit,
+    )
+
+
+def stream_batch_sites(session, batch_id, page_size=500):
+    """Recorre los sitios del batch (sin el texto) de a páginas."""
+    return stream_rows(session, BatchSite, COLUMNAS_SITIO, BatchSite.batch_id == batch_id, page_size=page_size)
+
+
+def stream_batch_responses(session, batch_id, page_size=500, with_text=False):
+    """Recorre las respuestas del batch de a páginas; el texto sólo con `with_text`."""
+    return stream_rows(
+        session, BatchPromptResponse, _columnas_respuesta(with_text),
+        BatchPromptResponse.batch_id == batch_id, page_size=page_size,
+    )
+
+
+async def get_site_responses(session, site_ids, with_text=True):
+    """Respuestas de los sitios dados (por ejemplo, los de una página)."""
+    filas = []
+    for lote in _lotes(site_ids):
+        filas += (await session.execute(
+            select(*_columnas_respuesta(with_text))
+            .where(BatchPromptResponse.batch_site_id.in_(lote))
+            .order_by(BatchPromptResponse.id)
+        )).all()
+    return filas
+
+
+async def get_response_texts(session, response_ids):
+    """Texto de las respuestas dadas: dict id -> respuesta."""
+    textos = {}
+    for lote in _lotes(response_ids):
+        filas = await session.execute(
+            select(BatchPromptResponse.id, BatchPromptResponse.respuesta)
+            .where(BatchPromptResponse.id.in_(lote))
+        )
+        textos.update(dict(filas.all()))
+    return textos
+
+
+async def get_response_stats(session, batch_id):
+    """
+    Resumen del uso por respuesta del batch, calculado en la base.
+
+    Returns:
+        dict: `respuestas`, `con_costo` (las que consumieron tokens), promedios
+            de `latencia`, `tokens_prompt` y `tokens_completion` de las que
+            tienen costo, y la lista de `modelos`.
+    """
+    con_costo = BatchPromptResponse.tokens_prompt > 0
+    fila = (await session.execute(
+        select(
+            func.count(),
+            func.count().filter(con_costo),
+            func.avg(func.coalesce(BatchPromptResponse.latencia, 0)).filter(con_costo),
+            func.avg(BatchPromptResponse.tokens_prompt).filter(con_costo),
+            func.avg(BatchPromptResponse.tokens_completion).filter(con_costo),
+        ).where(BatchPromptResponse.batch_id == batch_id)
+    )).one()
+    modelos = await session.scalars(
+        select(BatchPromptResponse.modelo).distinct()
+        .where(BatchPromptResponse.batch_id == batch_id, BatchPromptResponse.modelo.is_not(None))
+        .order_by(BatchPromptResponse.modelo)
+    )
+    return {
+        "respuestas": fila[0],
+        "con_costo": fila[1],
+        "latencia": fila[2],
+        "tokens_prompt": fila[3],
+        "tokens_completion": fila[4],
+        "modelos": list(modelos),
+    }
+
+
 async def update_batch(session, batch_id, **kwargs):
     try:
         batch = await session.get(Batch, batch_id)
@@ -214,6 +1022,170 @@ async def update_batch_site(session, batch_site_id, **kwargs):
     return batch_site
 
 
+async def add_batch_usage(
+    session, batch_id, consultas=0, tokens_prompt=0, tokens_cached=0, tokens_completion=0, segundos=0.0
+):
+    """Suma a los totales del batch el uso de una ejecución del análisis."""
+    batch = await session.get(Batch, batch_id)
+    batch.consultas = (batch.consultas or 0) + consultas
+    batch.tokens_prompt = (batch.tokens_prompt or 0) + tokens_prompt
+    batch.tokens_cached = (batch.tokens_cached or 0) + tokens_cached
+    batch.tokens_completion = (batch.tokens_completion or 0) + tokens_completion
+    batch.segundos_analisis = (batch.segundos_analisis or 0) + segundos
+    await session.commit()
+    return batch
+
+
+async def update_batch_status(session, batch_id, estado, segundos=0.0, errores=None, fecha_terminado=None):
+    """
+    Cambia el estado del batch y suma `segundos` a su duración.
+
+    Args:
+        estado (str): "pendiente", "en_curso", "completado" o "error".
+        segundos (float): Segundos de ejecución a sumar.
+        errores (int): Consultas fallidas de la ejecución (None no lo cambia).
+        fecha_terminado (datetime): Fecha de fin, para los batches completados.
+    """
+    valores = {"estado": estado, "duracion": Batch.duracion + segundos}
+    if errores is not None:
+        valores["errores"] = errores
+    if fecha_terminado is not None:
+        valores["fecha_terminado"] = fecha_terminado
+    await session.execute(Batch.__table__.update().where(Batch.id == batch_id).values(**valores))
+    await session.commit()
+
+
+async def save_checkpoint(session, batch_id, fase, estado=None):
+    checkpoint = await session.get(BatchCheckpoint, batch_id)
+    if checkpoint is None:
+        checkpoint = BatchCheckpoint(batch_id=batch_id)
+        session.add(checkpoint)
+    checkpoint.fase = fase
+    checkpoint.estado = json.dumps(estado) if estado is not None else None
+    checkpoint.fecha_actualizado = datetime.now()
+    await session.commit()
+    return checkpoint
+
+
+async def get_checkpoint(session, batch_id):
+    """Devuelve (fase, estado) del último checkpoint del batch, o (None, None)."""
+    checkpoint = await session.get(BatchCheckpoint, batch_id)
+    if checkpoint is None:
+        return None, None
+    estado = json.loads(checkpoint.estado) if checkpoint.estado else None
+    return checkpoint.fase, estado
+
+
+# Marcas de las coincidencias en los fragmentos de la búsqueda
+MARCA_INICIO, MARCA_FIN, ELIPSIS = "«", "»", "…"
+
+
+class ResultadoBusqueda:
+    """Coincidencia de una búsqueda en el texto de un sitio o en una respuesta."""
+
+    def __init__(self, tipo, batch_id, site_id, url, fragmento, rank, prompt=None, response_id=None):
+        self.tipo = tipo  # "sitio" o "respuesta"
+        self.batch_id = batch_id
+        self.site_id = site_id
+        self.url = url
+        self.fragmento = fragmento
+        self.rank = rank  # bm25 de su tabla: sólo se compara con los del mismo tipo
+        self.prompt = prompt
+        self.response_id = response_id
+
+
+class _Plegado(dict):
+    """Tabla de str.translate: minúsculas sin diacríticos, un caracter por caracter."""
+
+    def __missing__(self, codigo):
+        plegado = unicodedata.normalize("NFD", chr(codigo).lower())[0]
+        self[codigo] = plegado
+        return plegado
+
+
+_PLEGADO = _Plegado()
+
+
+def _terminos(consulta):
+    return re.findall(r"\w+", consulta or "")
+
+
+def _consulta_fts(terminos):
+    """Consulta FTS5 que exige todos los términos, cada uno como principio de palabra."""
+    return " ".join(f'"{t}"*' for t in terminos)
+
+
+def _fragmento(texto, terminos, ancho=200):
+    """Fragmento del texto alrededor de la primera coincidencia, con las coincidencias marcadas."""
+    plegado = texto.translate(_PLEGADO)
+    patron = re.compile(r"\b(?:" + "|".join(re.escape(t.translate(_PLEGADO)) for t in terminos) + r")\w*")
+    primera = patron.search(plegado)
+    inicio = max(0, primera.start() - ancho // 3) if primera else 0
+    if inicio:
+        espacio = texto.find(" ", inicio, primera.start())
+        inicio = espacio + 1 if espacio != -1 else inicio
+    fin = min(len(texto), inicio + ancho)
+    partes, actual = [], inicio
+    for coincidencia in patron.finditer(plegado, inicio, fin):
+        partes += [texto[actual:coincidencia.start()], MARCA_INICIO,
+                   texto[coincidencia.start():coincidencia.end()], MARCA_FIN]
+        actual = coincidencia.end()
+    partes.append(texto[actual:fin])
+    fragmento = " ".join("".join(partes).split())
+    return (ELIPSIS if inicio else "") + fragmento + (ELIPSIS if fin < len(texto) else "")
+
+
+async def search(session, consulta, limite=50):
+    """
+    Busca en el texto de los sitios y en las respuestas con los índices FTS5.
+
+    Cada índice tiene su propio bm25 (depende del largo de sus documentos y de
+    la frecuencia de los términos en esa tabla), así que los grupos no se mezclan.
+
+    Args:
+        consulta (str): Palabras a buscar; tienen que estar todas, sin importar
+            mayúsculas ni acentos, y pueden ser el principio de una palabra.
+        limite (int): Máximo de resultados de cada grupo.
+
+    Returns:
+        dict: "sitio" y "respuesta" -> List[ResultadoBusqueda], cada lista del
+            más relevante al menos relevante.
+    """
+    terminos = _terminos(consulta)
+    if not terminos:
+        return {"sitio": [], "respuesta": []}
+    parametros = {"consulta": _consulta_fts(terminos), "limite": limite}
+
+    sitios = (await session.execute(text(
+        "SELECT s.id, s.batch_id, s.url, s.texto_hash, f.rank "
+        "FROM busqueda_sitio f JOIN batch_site s ON s.id = f.rowid "
+        "WHERE busqueda_sitio MATCH :consulta ORDER BY f.rank LIMIT :limite"
+    ), parametros)).all()
+    textos = await get_site_texts(session, sitios)
+    resultados = {"sitio": [
+        ResultadoBusqueda("sitio", fila.batch_id, fila.id, fila.url,
+                          _fragmento(textos.get(fila.id) or "", terminos), fila.rank)
+        for fila in sitios
+    ]}
+
+    respuestas = await session.execute(text(
+        "SELECT r.id, r.batch_id, r.batch_site_id, s.url, p.prompt, "
+        f"snippet(busqueda_respuesta, 0, '{MARCA_INICIO}', '{MARCA_FIN}', '{ELIPSIS}', 32) AS fragmento, "
+        "f.rank "
+        "FROM busqueda_respuesta f "
+        "JOIN batch_prompt_response r ON r.id = f.rowid "
+        "JOIN batch_site s ON s.id = r.batch_site_id "
+        "JOIN batch_prompt p ON p.id = r.batch_prompt_id "
+        "WHERE busqueda_respuesta MATCH :consulta ORDER BY f.rank LIMIT :limite"
+    ), parametros)
+    resultados["respuesta"] = [
+        ResultadoBusqueda("respuesta", fila.batch_id, fila.batch_site_id, fila.url,
+                          fila.fragmento, fila.rank, prompt=fila.prompt, response_id=fila.id)
+        for fila in respuestas
+    ]
+    return resultados
+
+
 # Ejemplo de inicialización
 if __name__ == "__main__":
     import asyncio
@@ -0,0 +1,188 @@
+import asyncio
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+from playwright.async_api import async_playwright
+from dcProgresoBase import ProgresoBase
+
+# Recursos que el crawler no necesita para leer innerText y a[href]
+TIPOS_BLOQUEADOS = ("image", "media", "font", "stylesheet")
+# Trackers y redes de anuncios de terceros
+DOMINIOS_BLOQUEADOS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "facebook.net",
+    "connect.facebook.net",
+    "hotjar.com",
+    "scorecardresearch.com",
+    "amazon-adsystem.com",
+    "criteo.com",
+    "taboola.com",
+    "outbrain.com",
+    "adnxs.com",
+    "quantserve.com",
+    "clarity.ms",
+)
+
+
+class ResourcePolicy:
+    """
+    Política de bloqueo de solicitudes del navegador por tipo de recurso y por dominio.
+
+    Cuenta las solicitudes bloqueadas para medir su efecto en el batch.
+    """
+
+    def __init__(self, tipos=TIPOS_BLOQUEADOS, dominios=DOMINIOS_BLOQUEADOS):
+        """
+        Args:
+            tipos (iterable): Tipos de recurso de Playwright a bloquear.
+            dominios (iterable): Dominios (y sus subdominios) a bloquear.
+        """
+        self.tipos = frozenset(tipos)
+        self.dominios = tuple(dominios)
+        self.bloqueados = 0
+        self.por_tipo = {}
+
+    def should_block(self, resource_type, url):
+        if resource_type in self.tipos:
+            return True
+        host = urlparse(url).hostname or ""
+        return any(host == d or host.endswith("." + d) for d in self.dominios)
+
+    async def handle(self, route):
+        """Handler para `context.route`: aborta o deja pasar la solicitud."""
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self.bloqueados += 1
+            self.por_tipo[request.resource_type] = self.por_tipo.get(request.resource_type, 0) + 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+
+class dcBrowserPool(ProgresoBase):
+    """
+    Pool de navegador compartido para el crawler.
+
+    Mantiene un único Chromium abierto durante toda la vida del pool y reparte
+    páginas desde un conjunto pequeño de contextos reutilizables. El navegador
+    se reinicia cada `max_paginas_por_navegador` páginas para acotar la memoria.
+    """
+
+    def __init__(self, max_contextos=2, max_paginas_por_navegador=200, headless=True, resource_policy=None):
+        """
+        Inicializa el pool (el navegador se lanza recién al pedir la primera página).
+
+        Args:
+            max_contextos (int): Cantidad de contextos reutilizables.
+            max_paginas_por_navegador (int): Páginas servidas antes de reiniciar el navegador.
+            headless (bool): Si el navegador corre sin ventana.
+            resource_policy (ResourcePolicy, opcional): Bloqueo de recursos aplicado a
+                todos los contextos.
+        """
+        super().__init__()
+        self.max_contextos = max(1, max_contextos)
+        self.max_paginas_por_navegador = max_paginas_por_navegador
+        self.headless = headless
+        self.resource_policy = resource_policy
+        self._playwright = None
+        self._browser = None
+        self._contextos = []
+        self._siguiente = 0
+        self._paginas_servidas = 0
+        self._en_uso = 0
+        self._condicion = None
+
+    async def start(self):
+        """Arranca Playwright y lanza el navegador si todavía no está activo."""
+        if self._condicion is None:
+            self._condicion = asyncio.Condition()
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        if self._browser is None:
+            await self._lanzar()
+
+    async def close(self):
+        """Cierra el navegador y detiene Playwright."""
+        await self._cerrar_navegador()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @asynccontextmanager
+    async def page(self):
+        """
+        Entrega una página nueva de alguno de los contextos del pool.
+
+        La página se cierra al salir del bloque `async with`.
+        """
+        await self.start()
+        async with self._condicion:
+            # Un reinicio pendiente espera a que se liberen las páginas en uso
+            while self._debe_reiniciar() and self._en_uso > 0:
+                await self._condicion.wait()
+            if self._debe_reiniciar():
+                self.notificar_progreso(
+                    f"Reiniciando navegador tras {self._paginas_servidas} páginas"
+                )
+                await self._cerrar_navegador()
+                await self._lanzar()
+
+            contexto = self._contextos[self._siguiente % len(self._contextos)]
+            self._siguiente += 1
+            self._paginas_servidas += 1
+            self._en_uso += 1
+
+        pagina = None
+        try:
+            pagina = await contexto.new_page()
+            yield pagina
+        finally:
+            if pagina is not None:
+                try:
+                    await pagina.close()
+                except Exception:
+                    pass
+            async with self._condicion:
+                self._en_uso -= 1
+                self._condicion.notify_all()
+
+    def _debe_reiniciar(self):
+        if self._browser is None or not self._browser.is_connected():
+            return True
+        return self._paginas_servidas >= self.max_paginas_por_navegador
+
+    async def _lanzar(self):
+        self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        self._contextos = [await self._nuevo_contexto() for _ in range(self.max_contextos)]
+        self._paginas_servidas = 0
+
+    async def _nuevo_contexto(self):
+        contexto = await self._browser.new_context()
+        if self.resource_policy is not None:
+            await contexto.route("**/*", self.resource_policy.handle)
+        return contexto
+
+    async def _cerrar_navegador(self):
+        for contexto in self._contextos:
+            try:
+                await contexto.close()
+            except Exception:
+                pass
+        self._contextos = []
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
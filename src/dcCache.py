@@ -0,0 +1,106 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+def content_hash(text):
+    """Hash sha256 del texto enviado al modelo."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class dcCache:
+    """
+    Caché persistente de respuestas del modelo de lenguaje en SQLite.
+
+    La clave combina motor, temperatura, prompt de sistema, consigna y hash del
+    contenido, así que reiniciar un batch con el mismo texto y las mismas
+    consignas no vuelve a consultar la API. Expulsa entradas por antigüedad y,
+    pasado `max_entries`, las menos usadas recientemente.
+    """
+
+    def __init__(self, path="llm_cache.db", max_entries=50000, max_age_days=90, evict_every=200):
+        """
+        Args:
+            path (str): Archivo SQLite de la caché.
+            max_entries (int): Máximo de respuestas guardadas.
+            max_age_days (float): Antigüedad máxima de una respuesta.
+            evict_every (int): Escrituras entre pasadas de expulsión.
+        """
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self._escrituras = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS respuesta (
+                clave TEXT PRIMARY KEY,
+                respuesta TEXT NOT NULL,
+                creado REAL NOT NULL,
+                ultimo_uso REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_respuesta_ultimo_uso ON respuesta (ultimo_uso)")
+        self._conn.commit()
+
+    def key(self, engine, temperature, system_prompt, prompt, text):
+        datos = json.dumps([engine, temperature, system_prompt, prompt, content_hash(text)])
+        return hashlib.sha256(datos.encode("utf-8")).hexdigest()
+
+    def get(self, clave):
+        """Devuelve la respuesta guardada para la clave, o None."""
+        ahora = time.time()
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT respuesta, creado FROM respuesta WHERE clave = ?", (clave,)
+            ).fetchone()
+            if fila is None or ahora - fila[1] > self.max_age:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE respuesta SET ultimo_uso = ? WHERE clave = ?", (ahora, clave))
+            self._conn.commit()
+            self.hits += 1
+            return fila[0]
+
+    def put(self, clave, respuesta):
+        ahora = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO respuesta (clave, respuesta, creado, ultimo_uso) VALUES (?, ?, ?, ?)",
+                (clave, respuesta, ahora, ahora),
+            )
+            self._escrituras += 1
+            if self._escrituras % self.evict_every == 0:
+                self._evict(ahora)
+            self._conn.commit()
+
+    def evict(self):
+        """Elimina las entradas vencidas y las que exceden `max_entries`."""
+        with self._lock:
+            self._evict(time.time())
+            self._conn.commit()
+
+    def _evict(self, ahora):
+        self._conn.execute("DELETE FROM respuesta WHERE creado < ?", (ahora - self.max_age,))
+        self._conn.execute(
+            """DELETE FROM respuesta WHERE clave IN (
+                SELECT clave FROM respuesta ORDER BY ultimo_uso DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.max_entries,),
+        )
+
+    def stats(self):
+        """Texto con aciertos y fallos de la caché."""
+        total = self.hits + self.misses
+        porcentaje = 100 * self.hits / total if total else 0
+        return f"caché: {self.hits} aciertos, {self.misses} fallos ({porcentaje:.0f}%)"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
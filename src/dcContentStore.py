@@ -0,0 +1,73 @@
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # Sin zstandard se comprime con zlib y no hay diccionarios
+    zstandard = None
+
+
+class ContentCodec:
+    """
+    Compresión de los textos rastreados para el almacén de contenidos.
+
+    Usa zstd si el paquete `zstandard` está instalado y, si hay uno cargado,
+    el diccionario más reciente entrenado sobre el corpus (mejora mucho la
+    compresión de páginas cortas y parecidas entre sí). Sin zstd usa zlib.
+    Los textos comprimidos con cualquier codec o diccionario anterior se
+    siguen pudiendo leer mientras el diccionario esté cargado.
+    """
+
+    def __init__(self, nivel_zstd=9, nivel_zlib=6):
+        self.nivel_zstd = nivel_zstd
+        self.nivel_zlib = nivel_zlib
+        self.diccionarios = {}  # id -> zstandard.ZstdCompressionDict
+        self.diccionario_id = None  # Diccionario que se usa para comprimir
+        self._compresor = None
+
+    @property
+    def disponible_zstd(self):
+        return zstandard is not None
+
+    def cargar_diccionario(self, diccionario_id, datos, usar=True):
+        """Registra un diccionario guardado; con `usar` pasa a ser el de compresión."""
+        if zstandard is None:
+            return
+        self.diccionarios[diccionario_id] = zstandard.ZstdCompressionDict(datos)
+        if usar:
+            self.diccionario_id = diccionario_id
+            self._compresor = None
+
+    def compress(self, texto):
+        """
+        Comprime un texto.
+
+        Returns:
+            tuple: (codec, diccionario_id, datos) con codec "zstd" o "zlib".
+        """
+        datos = texto.encode("utf-8")
+        if zstandard is None:
+            return "zlib", None, zlib.compress(datos, self.nivel_zlib)
+        if self._compresor is None:
+            diccionario = self.diccionarios.get(self.diccionario_id)
+            self._compresor = zstandard.ZstdCompressor(level=self.nivel_zstd, dict_data=diccionario)
+        return "zstd", self.diccionario_id, self._compresor.compress(datos)
+
+    def decompress(self, codec, diccionario_id, datos):
+        if codec == "zlib":
+            return zlib.decompress(datos).decode("utf-8")
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("El contenido está comprimido con zstd: instale el paquete zstandard")
+            diccionario = self.diccionarios.get(diccionario_id) if diccionario_id is not None else None
+            return zstandard.ZstdDecompressor(dict_data=diccionario).decompress(datos).decode("utf-8")
+        raise ValueError(f"Codec de contenido desconocido: {codec}")
+
+    def train(self, muestras, tamanio=112640):
+        """Entrena un diccionario zstd con textos de muestra; None si no hay zstd o alcanzan."""
+        if zstandard is None or len(muestras) < 10:
+            return None
+        try:
+            diccionario = zstandard.train_dictionary(tamanio, [m.encode("utf-8") for m in muestras])
+        except zstandard.ZstdError:
+            return None
+        return diccionario.as_bytes()
@@ -1,6 +1,11 @@
-from playwright.async_api import async_playwright
+import asyncio
+from collections import deque
+from dcBrowserPool import dcBrowserPool
+from dcFrontier import crear_frontier, url_shape_penalty
+from dcHttpFetcher import dcHttpFetcher
+from dcPoliteness import dcPoliteness
 from dcProgresoBase import  ProgresoBase
-from urllib.parse import urlparse
+from dcUrl import canonicalize, registered_domain, crear_visited, visited_to_state, visited_from_state
 
 class dcCrawler (ProgresoBase):
     """
@@ -9,43 +14,186 @@ class dcCrawler (ProgresoBase):
     12-2024, BUE, Argentina, 3ra roca desde el Sol, Vía Láctea
     """
     
-    def __init__(self, base_url, max_depth = 1, max_chars=5000, max_pages=100, max_pages_per_site=3):
+    def __init__(self, base_url, max_depth = 1, max_chars=5000, max_pages=100, max_pages_per_site=3, pool=None, workers=1, capture_content=False, frontier="fifo", politeness=None, http_first=False, resource_policy=None, visited_mode="set"):
         """
         Inicializa el crawler.
         
         Args:
             base_url (str): URL inicial para rastrear.
             max_depth (int): Profundidad máxima de rastreo.
+            max_chars (int | None): Caracteres de texto que se guardan por página; None
+                guarda el texto completo (el recorte queda a cargo del presupuesto del oráculo).
+            pool (dcBrowserPool, opcional): Pool de navegador compartido. Si no se
+                proporciona, el crawler crea uno propio y lo cierra en `close()`.
+            workers (int): Cantidad de páginas que se cargan en paralelo durante el BFS.
+            capture_content (bool): Si el BFS guarda en `contenidos` el texto de cada
+                página que renderiza, evitando volver a cargarla en `fetch_page_content`.
+            frontier (str | Frontier): Orden de visita de la cola: "fifo" (BFS clásico),
+                "prioridad" (por `score_url`) o "dominio" (round-robin entre dominios).
+            politeness (dcPoliteness, opcional): Planificador de cortesía por host. Si no
+                se proporciona, el crawler usa uno propio con robots.txt y 1 s entre cargas.
+            http_first (bool): Si las páginas se descargan primero por HTTP y sólo se
+                usa el navegador cuando parecen renderizadas con JavaScript.
+            resource_policy (ResourcePolicy, opcional): Bloqueo de imágenes, fuentes,
+                estilos y trackers para el pool propio del crawler.
+            visited_mode (str): Conjunto de visitadas: "set" (URLs completas),
+                "fingerprint" (huellas de 64 bits) o "bloom" (memoria fija) para crawls grandes.
         """
         super().__init__()
-        self.base_url = base_url
+        self.base_url = canonicalize(base_url)
         self.max_depth = max_depth
         self.max_chars = max_chars
         self.max_pages = max_pages 
         self.max_pages_per_site = max_pages_per_site
-        self.visited = set()
+        self.workers = max(1, workers)
+        self.capture_content = capture_content
+        self.contenidos = {}  # URL -> texto capturado durante el rastreo (y todavía no guardado)
+        self.claves_contenido = {}  # URL -> clave del texto en el almacén registrado
+        self.on_contenidos = None
+        self.frontier = crear_frontier(frontier, self)
+        self.visited = crear_visited(visited_mode)
         self.analizar = set()   
         self.domain_counts = {}
-        self.base_domain = self.get_domain(base_url)    
-       
-    
+        self.base_domain = self.get_domain(self.base_url)
+        self.en_curso = deque()  # (URL, profundidad, tarea) cargándose, en orden de extracción
+        self.paginas_procesadas = 0
+        self.on_checkpoint = None
+        self.checkpoint_every = 10
+        self._restaurado = False
+        self._pool_propio = pool is None
+        self.pool = pool if pool is not None else dcBrowserPool(
+            max_contextos=min(self.workers, 4), resource_policy=resource_policy
+        )
+        if self._pool_propio:
+            self.pool.registrar_notificador(self.notificar_progreso)
+        self._politeness_propio = politeness is None
+        self.politeness = politeness if politeness is not None else dcPoliteness()
+        if self._politeness_propio:
+            self.politeness.registrar_notificador(self.notificar_progreso)
+        self.http_fetcher = dcHttpFetcher() if http_first else None
+        if self.http_fetcher is not None:
+            self.http_fetcher.registrar_notificador(self.notificar_progreso)
+
+    def registrar_checkpoint(self, callback, cada=10):
+        """
+        Registra una corrutina que recibe `export_state()` cada `cada` páginas procesadas.
+
+        Args:
+            callback (function): Corrutina `callback(estado)` que persiste el estado.
+            cada (int): Páginas procesadas entre checkpoints.
+        """
+        self.on_checkpoint = callback
+        self.checkpoint_every = max(1, cada)
+
+    def registrar_almacen(self, callback):
+        """
+        Registra dónde guardar los textos capturados, para no llevarlos en memoria ni en los checkpoints.
+
+        Los textos se guardan antes de cada checkpoint y al terminar el rastreo
+        (`guardar_contenidos`); el estado exportado sólo lleva sus claves.
+
+        Args:
+            callback (function): Corrutina `callback(textos)` que guarda una lista de
+                textos y devuelve la clave de cada uno, en el mismo orden.
+        """
+        self.on_contenidos = callback
+
+    async def guardar_contenidos(self):
+        """Pasa al almacén los textos capturados de las URLs a analizar y los libera de memoria."""
+        if self.on_contenidos is None:
+            return
+        urls = [url for url in self.contenidos if url in self.analizar]
+        if urls:
+            claves = await self.on_contenidos([self.contenidos[url] for url in urls])
+            self.claves_contenido.update(zip(urls, claves))
+        # Las URLs que no se analizan no vuelven a necesitar su texto
+        self.contenidos = {}
+
+    def export_state(self):
+        """
+        Devuelve el estado del rastreo como dict apto para JSON.
+
+        Las páginas que se estaban cargando vuelven a la frontera, para que un
+        rastreo reanudado las procese. Con un almacén registrado los textos
+        capturados van como claves (llamar antes a `guardar_contenidos`); sin él,
+        van completos.
+        """
+        pendientes = [(url, depth) for url, depth, _ in self.en_curso] + self.frontier.items()
+        return {
+            "frontier": pendientes,
+            "visited": visited_to_state(self.visited),
+            "analizar": sorted(self.analizar),
+            "domain_counts": self.domain_counts,
+            "contenidos": {
+                url: texto for url, texto in self.contenidos.items()
+                if url in self.analizar and self.on_contenidos is None
+            },
+            "claves_contenido": self.claves_contenido,
+            "paginas_procesadas": self.paginas_procesadas,
+        }
+
+    def restore_state(self, estado):
+        """Restaura un estado guardado con `export_state()`; `crawl_bfs` continúa desde ahí."""
+        for url, depth in estado["frontier"]:
+            self.frontier.push(url, depth)
+        self.visited = visited_from_state(estado["visited"])
+        self.analizar = set(estado["analizar"])
+        self.domain_counts = dict(estado["domain_counts"])
+        self.contenidos = dict(estado.get("contenidos", {}))
+        self.claves_contenido = dict(estado.get("claves_contenido", {}))
+        self.paginas_procesadas = estado["paginas_procesadas"]
+        self._restaurado = True
+
+    async def close(self):
+        """Libera el navegador y los clientes HTTP propios del crawler."""
+        if self._pool_propio:
+            await self.pool.close()
+        if self._politeness_propio:
+            await self.politeness.close()
+        if self.http_fetcher is not None:
+            await self.http_fetcher.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def load_page(self, page, url):
+        """Navega a la URL y espera a que el DOM esté listo."""
+        await page.goto(url, timeout=60000)
+        await page.wait_for_load_state("domcontentloaded")
+
+    async def visit(self, url, want_links=True, want_text=True):
+        """
+        Carga la URL respetando el turno del host y devuelve (enlaces, texto).
+
+        Con `http_first` prueba primero la descarga HTTP y recurre al navegador
+        sólo si la página parece renderizada con JavaScript.
+        """
+        async with self.politeness.turn(url):
+            if self.http_fetcher is not None:
+                resultado = await self.http_fetcher.fetch(url)
+                if resultado is not None:
+                    links, texto = resultado
+                    return links, texto[:self.max_chars]
+
+            async with self.pool.page() as page:
+                await self.load_page(page, url)
+                texto = await self.extract_text(page) if want_text else None
+                links = await self.extract_valid_links(page) if want_links else []
+                return links, texto
+
     async def fetch_page_content(self, url):
         """Extrae el contenido de texto plano de una página web."""
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context()
-            page = await context.new_page()
-            
-            try:
-                await page.goto(url, timeout=60000)
-                await page.wait_for_load_state("domcontentloaded")
-                text_content = await page.evaluate("document.body.innerText")
-                return text_content[:self.max_chars]  # Limit content length
-            except Exception as e:
-                self.notificar_progreso(f"Error al cargar la página {url}: {e}")
+        try:
+            if not await self.politeness.allowed(url):
                 return None
-            finally:
-                await browser.close()
+            _, texto = await self.visit(url, want_links=False)
+            return texto
+        except Exception as e:
+            self.notificar_progreso(f"Error al cargar la página {url}: {e}")
+            return None
 
     def check_max_pages(self):
         """Check if the maximum number of pages has been reached."""
@@ -75,58 +223,113 @@ class dcCrawler (ProgresoBase):
         return True
 
     def get_domain(self,url):
-        return urlparse(url).netloc
+        """Dominio registrado de la URL; agrupa subdominios para `domain_counts`."""
+        return registered_domain(url)
+
+    def score_url(self, url, depth):
+        """
+        Puntaje de prioridad de una URL para la frontera "prioridad" (menor es mejor).
+
+        Prioriza menor profundidad, luego dominios con cupo de `max_pages_per_site`
+        disponible y por último URLs con forma de página de contenido.
+        """
+        usadas = self.domain_counts.get(self.get_domain(url), 0)
+        sin_cupo = 1 if usadas >= self.max_pages_per_site else 0
+        return depth * 10 + sin_cupo * 5 + url_shape_penalty(url)
     
     async def crawl_bfs(self):        
-        """Realiza el rastreo BFS hasta la profundidad máxima."""
-        queue = [(self.base_url, 0)]  # Cola de tuplas (URL, profundidad)
-        self.visited.add(self.base_url.lower())
-        while queue:
-            url, depth = queue.pop(0)  # Extrae el primer elemento de la cola
+        """
+        Realiza el rastreo BFS hasta la profundidad máxima.
 
-            if depth > self.max_depth or self.check_max_pages() :
-                break
+        Con `workers` > 1 se cargan hasta `workers` páginas de la cola en paralelo,
+        pero los resultados se procesan en el orden en que se lanzaron las cargas y
+        los enlaces de cada página en el orden de extracción: con las mismas páginas,
+        `visited`, `analizar` y `domain_counts` no dependen de cuál termine primero.
+
+        Sólo con la frontera FIFO quedan además igual que en el rastreo serial. Con
+        "prioridad" o "dominio" las URLs ya sacadas de la cola no compiten con los
+        enlaces que traen las páginas en curso, así que el orden puede diferir del serial.
+        """
+        queue = self.frontier  # Cola de tuplas (URL, profundidad)
+        if not self._restaurado:
+            queue.push(self.base_url, 0)
+            self.visited.add(self.base_url)
+        en_curso = self.en_curso
 
-            self.notificar_progreso(f"Extrayendo links de: {url} ({len(self.visited)} de {self.max_pages}) Prof: {depth}")
+        try:
+            while queue or en_curso:
+                # Lanza cargas hasta completar la ventana de workers
+                while queue and len(en_curso) < self.workers and not self.check_max_pages():
+                    url, depth = queue.pop()
+                    if depth > self.max_depth:
+                        continue
+                    self.notificar_progreso(f"Extrayendo links de: {url} ({len(self.visited)} de {self.max_pages}) Prof: {depth}")
+                    en_curso.append((url, depth, asyncio.ensure_future(self.extract_links_from(url))))
 
-            # Extrae enlaces y guarda contenido
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(headless=True)
-                context = await browser.new_context()
-                page = await context.new_page()
+                if not en_curso:
+                    break
 
-                try:
-                    await page.goto(url, timeout=60000)
-                    await page.wait_for_load_state("domcontentloaded")
+                links = await en_curso[0][2]
+                _, depth, _ = en_curso.popleft()
 
-                    # Extrae enlaces                    
-                    links = await self.extract_valid_links(page)
+                if self.check_max_pages():
+                    break
 
-                    for link in set(links):
-                        link = link.lower()
+                self.enqueue_links(links, depth, queue)
+                self.paginas_procesadas += 1
+                if self.on_checkpoint is not None and self.paginas_procesadas % self.checkpoint_every == 0:
+                    await self.guardar_contenidos()
+                    await self.on_checkpoint(self.export_state())
+        finally:
+            for _, _, tarea in en_curso:
+                tarea.cancel()
+            if en_curso:
+                await asyncio.gather(*(t for _, _, t in en_curso), return_exceptions=True)
+        await self.guardar_contenidos()
 
-                        if (self.check_max_pages_per_site(link)== False):
-                            analizara = " & analizará"
-                            self.analizar.add(link)   
-                        else:
-                            analizara = ""                         
+    async def extract_text(self, page):
+        """Devuelve el texto plano de la página limitado a `max_chars` (si no es None)."""
+        text_content = await page.evaluate("document.body.innerText")
+        return text_content[:self.max_chars]  # Limit content length
 
-                        if link not in self.visited:
-                            self.visited.add(link)
-                            queue.append((link, depth + 1))
-                            self.notificar_progreso(f"Se visitará{analizara} {link} ({len(self.visited)}/{self.max_pages}) Prof: {depth + 1}")
-                            if self.check_max_pages():
-                                break
+    async def extract_links_from(self, url):
+        """
+        Carga la página y devuelve sus enlaces válidos (lista vacía si falla).
 
+        Con `capture_content` también guarda el texto de la página en `contenidos`.
+        """
+        try:
+            if not await self.politeness.allowed(url):
+                return []
+            links, texto = await self.visit(url, want_text=self.capture_content)
+            if self.capture_content:
+                self.contenidos[url] = texto
+            return links
+        except Exception as e:
+            self.notificar_progreso(f"Error al procesar la página {url}: {e}")
+            return []
 
-                except Exception as e:
-                    self.notificar_progreso(f"Error al procesar la página {url}: {e}")                   
+    def enqueue_links(self, links, depth, queue):
+        """Marca los enlaces de una página de profundidad `depth` y encola los nuevos."""
+        # Sin repetidos pero en el orden de la página (un set cambia de orden entre ejecuciones)
+        for link in dict.fromkeys(links):
+            link = canonicalize(link)
 
-                finally:
-                    await browser.close()
+            # Una URL ya elegida para analizar no vuelve a consumir cupo de su dominio
+            if link in self.analizar or self.check_max_pages_per_site(link) == False:
+                analizara = " & analizará"
+                self.analizar.add(link)   
+            else:
+                analizara = ""                         
 
-            if(queue == []):
-                break
+            if link not in self.visited:
+                self.visited.add(link)
+                # Los enlaces más allá de la profundidad máxima se registran pero no se cargan
+                if depth + 1 <= self.max_depth:
+                    queue.push(link, depth + 1)
+                self.notificar_progreso(f"Se visitará{analizara} {link} ({len(self.visited)}/{self.max_pages}) Prof: {depth + 1}")
+                if self.check_max_pages():
+                    break
 
     async def extract_valid_links(self, page):
         #a.target !== '_blank' &&
@@ -143,30 +346,23 @@ class dcCrawler (ProgresoBase):
 
     async def crawl_recursive(self, url, depth):
         """Rastrea una página específica y extrae enlaces internos."""
-        if url.lower() in self.visited or depth > self.max_depth or self.check_max_pages():
+        url = canonicalize(url)
+        if url in self.visited or depth > self.max_depth or self.check_max_pages():
             return []
         
-        self.visited.add(url.lower())
+        self.visited.add(url)
         self.notificar_progreso(f"Visitando: {url} - Visitados: {len(self.visited)} de {self.max_pages} - Profundidad: {depth}")
 
         if self.check_max_pages(): 
             return list(self.visited)
 
         # Extrae enlaces para rastrear
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context()
-            page = await context.new_page()
-            
+        links = []
+        if await self.politeness.allowed(url):
             try:
-                await page.goto(url, timeout=60000)
-                await page.wait_for_load_state("domcontentloaded")
-                links = await self.extract_valid_links(page)
+                links, _ = await self.visit(url, want_text=False)
             except Exception as e:
                 self.notificar_progreso(f"Error al extraer enlaces de {url}: {e}")
-                links = []
-            finally:
-                await browser.close()
 
         # Rastrear cada enlace interno
         for link in set(links):
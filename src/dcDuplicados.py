@@ -0,0 +1,86 @@
+import hashlib
+import re
+
+BITS = 64
+BANDAS = 4  # Con distancia <= BANDAS - 1 al menos una banda coincide exacta
+BITS_BANDA = BITS // BANDAS
+
+
+class Huella:
+    """Huella de un texto: hash exacto y SimHash de 64 bits."""
+
+    def __init__(self, exacta, simhash, palabras):
+        self.exacta = exacta
+        self.simhash = simhash
+        self.palabras = palabras
+
+
+class DetectorDuplicados:
+    """
+    Detecta contenidos duplicados y casi duplicados dentro de un batch.
+
+    Compara primero por hash exacto del texto normalizado y luego por SimHash
+    sobre shingles de palabras, indexado por bandas para no comparar contra
+    todos los sitios ya vistos.
+    """
+
+    def __init__(self, max_distancia=3, shingle=3, min_palabras=30):
+        """
+        Args:
+            max_distancia (int): Bits distintos tolerados entre SimHash (hasta BANDAS - 1).
+            shingle (int): Palabras por shingle.
+            min_palabras (int): Textos más cortos sólo se comparan por hash exacto.
+        """
+        self.max_distancia = min(max_distancia, BANDAS - 1)
+        self.shingle = shingle
+        self.min_palabras = min_palabras
+        self._exactos = {}
+        self._bandas = {}
+
+    def huella(self, texto):
+        """Calcula la huella de un texto."""
+        palabras = re.findall(r"\w+", (texto or "").lower())
+        exacta = hashlib.sha256(" ".join(palabras).encode("utf-8")).hexdigest()
+        return Huella(exacta, simhash(palabras, self.shingle), len(palabras))
+
+    def buscar(self, huella):
+        """Devuelve el id del sitio canónico del que `huella` es duplicado, o None."""
+        if huella.exacta in self._exactos:
+            return self._exactos[huella.exacta]
+        if huella.palabras < self.min_palabras:
+            return None
+        for banda in _bandas(huella.simhash):
+            for simhash_canonico, canonico_id in self._bandas.get(banda, ()):
+                if hamming(huella.simhash, simhash_canonico) <= self.max_distancia:
+                    return canonico_id
+        return None
+
+    def agregar(self, huella, sitio_id):
+        """Registra un sitio canónico."""
+        self._exactos.setdefault(huella.exacta, sitio_id)
+        if huella.palabras >= self.min_palabras:
+            for banda in _bandas(huella.simhash):
+                self._bandas.setdefault(banda, []).append((huella.simhash, sitio_id))
+
+
+def simhash(palabras, shingle=3):
+    """SimHash de 64 bits sobre shingles de `shingle` palabras."""
+    if len(palabras) < shingle:
+        shingles = [" ".join(palabras)]
+    else:
+        shingles = (" ".join(palabras[i:i + shingle]) for i in range(len(palabras) - shingle + 1))
+    pesos = [0] * BITS
+    for s in shingles:
+        h = int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(BITS):
+            pesos[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(BITS) if pesos[bit] > 0)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def _bandas(valor):
+    mascara = (1 << BITS_BANDA) - 1
+    return [(i, valor >> (i * BITS_BANDA) & mascara) for i in range(BANDAS)]
@@ -0,0 +1,362 @@
+import email.parser
+import email.policy
+import argparse
+import collections
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dcTokens import Tokenizer
+
+
+def respuesta_simulada(body):
+    """
+    Respuesta determinística de chat completions para el cuerpo de una consulta.
+
+    Si se pide `json_object` devuelve un JSON con una respuesta por cada
+    consigna `[id]` del mensaje; si no, un texto derivado de la consigna.
+    """
+    mensaje = body["messages"][-1]["content"]
+    huella = hashlib.sha256(mensaje.encode("utf-8")).hexdigest()[:8]
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        consignas = mensaje.split("CONSIGNAS:\n", 1)[-1]
+        respuestas = {
+            prompt_id: f"Respuesta simulada a «{consigna.strip()}» ({huella})"
+            for prompt_id, consigna in re.findall(r"^\[([^\]]+)\](.*)$", consignas, re.MULTILINE)
+        }
+        content = json.dumps(respuestas, ensure_ascii=False)
+    else:
+        consigna = mensaje.split("CONSIGNA:\n", 1)[-1].strip()
+        content = f"Respuesta simulada a «{consigna}» ({huella})"
+    tokenizer = Tokenizer(body.get("model", "gpt-4o-mini"))
+    prompt_tokens = sum(tokenizer.count(m["content"]) + 4 for m in body["messages"])
+    return {
+        "id": f"chatcmpl-{huella}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o-mini"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": tokenizer.count(content),
+            "total_tokens": prompt_tokens + tokenizer.count(content),
+            "prompt_tokens_details": {"cached_tokens": 0},
+        },
+    }
+
+
+def _error(mensaje, tipo, codigo=None):
+    return {"error": {"message": mensaje, "type": tipo, "param": None, "code": codigo}}
+
+
+class dcFakeServer:
+    """
+    Servidor local compatible con la API de OpenAI para pruebas y benchmarks.
+
+    Imita chat completions y los endpoints de archivos y batches sin costo ni
+    red. Las respuestas son determinísticas (dependen sólo del mensaje) e
+    informan `usage` contado con el tokenizador del modelo. Chat completions
+    simula una latencia con distribución lognormal (más un tiempo por token de
+    salida), errores 429/500 inyectados con la probabilidad pedida y, si se
+    configuran `rpm`/`tpm`, límites por minuto con headers `x-ratelimit-*` y
+    `retry-after-ms` como los de la API. Los trabajos de batches se informan
+    "in_progress" durante `batch_delay` segundos y después se completan.
+
+    Se usa apuntando el cliente a `base_url` (OPENAI_BASE_URL en el .env).
+    """
+
+    def __init__(
+        self, host="127.0.0.1", port=0, batch_delay=1.0, latency_mean=0.0, latency_sd=0.0,
+        latency_per_token=0.0, error_429_rate=0.0, error_500_rate=0.0, rpm=None, tpm=None, seed=0,
+    ):
+        """
+        Args:
+            host (str): Interfaz donde escuchar.
+            port (int): Puerto; 0 elige uno libre.
+            batch_delay (float): Segundos que tarda cada trabajo de batches en completarse.
+            latency_mean (float): Latencia media de chat completions, en segundos.
+            latency_sd (float): Desvío de la latencia (0 la hace constante).
+            latency_per_token (float): Segundos extra por token de salida.
+            error_429_rate (float): Probabilidad de responder 429 a una consulta.
+            error_500_rate (float): Probabilidad de responder 500 a una consulta.
+            rpm (int): Límite de solicitudes por minuto (None sin límite).
+            tpm (int): Límite de tokens por minuto (None sin límite).
+            seed (int): Semilla de las latencias y los errores inyectados.
+        """
+        self.batch_delay = batch_delay
+        self.latency_mean = latency_mean
+        self.latency_sd = latency_sd
+        self.latency_per_token = latency_per_token
+        self.error_429_rate = error_429_rate
+        self.error_500_rate = error_500_rate
+        self.rpm = rpm
+        self.tpm = tpm
+        self.files = {}
+        self.batches = {}
+        self.estadisticas = collections.Counter()
+        self._random = random.Random(seed)
+        self._ventana = collections.deque()  # (instante, tokens) del último minuto
+        self._lock = threading.Lock()
+        self._thread = None
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                servidor._atender(self, "GET")
+
+            def do_POST(self):
+                servidor._atender(self, "POST")
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        """Atiende en un hilo aparte."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _atender(self, handler, metodo):
+        ruta = handler.path.split("?", 1)[0].rstrip("/")
+        largo = int(handler.headers.get("Content-Length") or 0)
+        cuerpo = handler.rfile.read(largo) if largo else b""
+        try:
+            if metodo == "POST" and ruta == "/v1/chat/completions":
+                return self._json(handler, *self.chat(json.loads(cuerpo)))
+            if metodo == "POST" and ruta == "/v1/files":
+                return self._json(handler, 200, self.crear_archivo(handler.headers["Content-Type"], cuerpo))
+            if metodo == "GET" and (m := re.fullmatch(r"/v1/files/([\w-]+)/content", ruta)):
+                return self._enviar(handler, 200, self.files[m[1]]["contenido"], "application/octet-stream")
+            if metodo == "GET" and (m := re.fullmatch(r"/v1/files/([\w-]+)", ruta)):
+                return self._json(handler, 200, self.files[m[1]]["archivo"])
+            if metodo == "POST" and ruta == "/v1/batches":
+                return self._json(handler, 200, self.crear_batch(json.loads(cuerpo)))
+            if metodo == "GET" and (m := re.fullmatch(r"/v1/batches/([\w-]+)", ruta)):
+                return self._json(handler, 200, self.estado_batch(m[1]))
+        except KeyError as e:
+            return self._json(handler, 404, {"error": {"message": f"No existe {e}", "type": "invalid_request_error"}})
+        self._json(handler, 404, {"error": {"message": f"Ruta desconocida {metodo} {ruta}"}})
+
+    def _json(self, handler, status, datos, headers=None):
+        contenido = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+        self._enviar(handler, status, contenido, "application/json", headers)
+
+    def _enviar(self, handler, status, contenido, tipo, headers=None):
+        handler.send_response(status)
+        handler.send_header("Content-Type", tipo)
+        handler.send_header("Content-Length", str(len(contenido)))
+        for nombre, valor in (headers or {}).items():
+            handler.send_header(nombre, valor)
+        handler.end_headers()
+        handler.wfile.write(contenido)
+
+    def chat(self, body):
+        """
+        Atiende una consulta de chat completions.
+
+        Returns:
+            tuple: (status, datos, headers) de la respuesta HTTP.
+        """
+        respuesta = respuesta_simulada(body)
+        tokens = respuesta["usage"]["total_tokens"]
+        with self._lock:
+            self.estadisticas["solicitudes"] += 1
+            sorteo = self._random.random()
+            latencia = self._latencia() + self.latency_per_token * respuesta["usage"]["completion_tokens"]
+            headers, espera = self._consumir_cupo(tokens)
+
+        if espera > 0 or sorteo < self.error_429_rate:
+            self.estadisticas["429"] += 1
+            headers["retry-after-ms"] = str(int(max(espera, 0.05) * 1000))
+            return 429, _error("Rate limit reached (simulado)", "requests", "rate_limit_exceeded"), headers
+        time.sleep(latencia)
+        if sorteo < self.error_429_rate + self.error_500_rate:
+            self.estadisticas["500"] += 1
+            return 500, _error("The server had an error (simulado)", "server_error"), headers
+        self.estadisticas["ok"] += 1
+        return 200, respuesta, headers
+
+    def _latencia(self):
+        """Latencia lognormal con la media y el desvío configurados."""
+        if self.latency_mean <= 0:
+            return 0.0
+        if self.latency_sd <= 0:
+            return self.latency_mean
+        sigma2 = math.log(1 + (self.latency_sd / self.latency_mean) ** 2)
+        mu = math.log(self.latency_mean) - sigma2 / 2
+        return self._random.lognormvariate(mu, math.sqrt(sigma2))
+
+    def _consumir_cupo(self, tokens):
+        """
+        Registra la solicitud en la ventana del último minuto si entra en los límites.
+
+        Returns:
+            tuple: (headers x-ratelimit-*, segundos hasta que haya cupo o 0 si se aceptó).
+        """
+        ahora = time.monotonic()
+        while self._ventana and ahora - self._ventana[0][0] >= 60:
+            self._ventana.popleft()
+        usados = sum(t for _, t in self._ventana)
+        espera = 0.0
+        if self.rpm is not None and len(self._ventana) >= self.rpm:
+            espera = max(espera, 60 - (ahora - self._ventana[0][0]))
+        if self.tpm is not None and usados + tokens > self.tpm:
+            liberados = 0
+            for instante, t in self._ventana:
+                liberados += t
+                if usados - liberados + tokens <= self.tpm:
+                    espera = max(espera, 60 - (ahora - instante))
+                    break
+        if espera == 0:
+            self._ventana.append((ahora, tokens))
+            usados += tokens
+
+        headers = {}
+        reinicio = f"{60 - (ahora - self._ventana[0][0]):.3f}s" if self._ventana else "0s"
+        if self.rpm is not None:
+            headers["x-ratelimit-limit-requests"] = str(self.rpm)
+            headers["x-ratelimit-remaining-requests"] = str(max(self.rpm - len(self._ventana), 0))
+            headers["x-ratelimit-reset-requests"] = reinicio
+        if self.tpm is not None:
+            headers["x-ratelimit-limit-tokens"] = str(self.tpm)
+            headers["x-ratelimit-remaining-tokens"] = str(max(self.tpm - usados, 0))
+            headers["x-ratelimit-reset-tokens"] = reinicio
+        return headers, espera
+
+    def guardar_archivo(self, contenido, filename, purpose):
+        archivo_id = f"file-{uuid.uuid4().hex[:24]}"
+        archivo = {
+            "id": archivo_id,
+            "object": "file",
+            "bytes": len(contenido),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+        with self._lock:
+            self.files[archivo_id] = {"archivo": archivo, "contenido": contenido}
+        return archivo
+
+    def crear_archivo(self, content_type, cuerpo):
+        """Guarda un archivo subido como multipart/form-data."""
+        mensaje = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + cuerpo
+        )
+        campos, contenido, filename = {}, b"", "archivo"
+        for parte in mensaje.iter_parts():
+            nombre = parte.get_param("name", header="content-disposition")
+            if parte.get_filename():
+                contenido, filename = parte.get_payload(decode=True), parte.get_filename()
+            else:
+                campos[nombre] = parte.get_payload(decode=True).decode("utf-8")
+        return self.guardar_archivo(contenido, filename, campos.get("purpose", "batch"))
+
+    def crear_batch(self, datos):
+        entrada = self.files[datos["input_file_id"]]["contenido"]
+        lineas = [json.loads(linea) for linea in entrada.decode("utf-8").splitlines() if linea.strip()]
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": datos["endpoint"],
+            "input_file_id": datos["input_file_id"],
+            "completion_window": datos["completion_window"],
+            "status": "validating",
+            "created_at": int(time.time()),
+            "request_counts": {"total": len(lineas), "completed": 0, "failed": 0},
+        }
+        with self._lock:
+            self.batches[batch_id] = {"batch": batch, "lineas": lineas, "inicio": time.monotonic()}
+        return batch
+
+    def estado_batch(self, batch_id):
+        """Avanza el trabajo según el tiempo transcurrido y devuelve su estado."""
+        with self._lock:
+            registro = self.batches[batch_id]
+            batch = registro["batch"]
+            if batch["status"] == "completed":
+                return batch
+            if time.monotonic() - registro["inicio"] < self.batch_delay:
+                batch["status"] = "in_progress"
+                batch.setdefault("in_progress_at", int(time.time()))
+                return batch
+
+        salida = []
+        for linea in registro["lineas"]:
+            salida.append({
+                "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+                "custom_id": linea["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "request_id": uuid.uuid4().hex,
+                    "body": respuesta_simulada(linea["body"]),
+                },
+                "error": None,
+            })
+        contenido = "".join(json.dumps(s, ensure_ascii=False) + "\n" for s in salida).encode("utf-8")
+        archivo = self.guardar_archivo(contenido, f"{batch_id}_output.jsonl", "batch_output")
+        with self._lock:
+            batch.update(
+                status="completed",
+                output_file_id=archivo["id"],
+                completed_at=int(time.time()),
+                request_counts={"total": len(salida), "completed": len(salida), "failed": 0},
+            )
+            return batch
+
+
+if __name__ == "__main__":
+    # Servidor de prueba: OPENAI_BASE_URL=http://127.0.0.1:8765/v1 en el .env
+    parser = argparse.ArgumentParser(description="Servidor simulado compatible con la API de OpenAI")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="latencia media en segundos")
+    parser.add_argument("--latency-sd", type=float, default=0.2, help="desvío de la latencia")
+    parser.add_argument("--error-429", type=float, default=0.0, help="probabilidad de 429")
+    parser.add_argument("--error-500", type=float, default=0.0, help="probabilidad de 500")
+    parser.add_argument("--rpm", type=int, default=None)
+    parser.add_argument("--tpm", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with dcFakeServer(
+        port=args.port, latency_mean=args.latency, latency_sd=args.latency_sd,
+        error_429_rate=args.error_429, error_500_rate=args.error_500,
+        rpm=args.rpm, tpm=args.tpm, seed=args.seed,
+    ) as servidor:
+        print(f"Servidor simulado en {servidor.base_url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            print(dict(servidor.estadisticas))
@@ -0,0 +1,172 @@
+import heapq
+import itertools
+from abc import ABC, abstractmethod
+from collections import deque
+from urllib.parse import urlparse
+
+
+class Frontier(ABC):
+    """
+    Cola de URLs pendientes de rastrear.
+    """
+
+    @abstractmethod
+    def push(self, url, depth):
+        """Agrega una URL con su profundidad."""
+
+    @abstractmethod
+    def pop(self):
+        """Extrae la siguiente tupla (URL, profundidad)."""
+
+    @abstractmethod
+    def items(self):
+        """Devuelve las tuplas (URL, profundidad) pendientes, sin extraerlas."""
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+    def __bool__(self):
+        return len(self) > 0
+
+
+class FrontierFIFO(Frontier):
+    """Cola FIFO clásica del BFS, sobre un deque (extracción O(1))."""
+
+    def __init__(self):
+        self._cola = deque()
+
+    def push(self, url, depth):
+        self._cola.append((url, depth))
+
+    def pop(self):
+        return self._cola.popleft()
+
+    def items(self):
+        return list(self._cola)
+
+    def __len__(self):
+        return len(self._cola)
+
+
+class FrontierPrioridad(Frontier):
+    """
+    Cola de prioridad sobre un heap: se extrae primero la URL de menor puntaje.
+
+    El puntaje se recalcula al extraer (por ejemplo porque el dominio agotó su
+    cupo); si empeoró respecto del siguiente, la URL se reinserta.
+    """
+
+    def __init__(self, puntaje):
+        """
+        Args:
+            puntaje (function): Función (url, depth) -> número; menor es más prioritario.
+        """
+        self.puntaje = puntaje
+        self._heap = []
+        self._orden = itertools.count()
+
+    def push(self, url, depth):
+        heapq.heappush(self._heap, (self.puntaje(url, depth), next(self._orden), url, depth))
+
+    def pop(self):
+        while True:
+            puntaje, orden, url, depth = heapq.heappop(self._heap)
+            actual = self.puntaje(url, depth)
+            if actual > puntaje and self._heap and actual > self._heap[0][0]:
+                heapq.heappush(self._heap, (actual, orden, url, depth))
+                continue
+            return url, depth
+
+    def items(self):
+        return [(url, depth) for _, _, url, depth in sorted(self._heap)]
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class FrontierPorDominio(Frontier):
+    """
+    Sub-colas FIFO por dominio atendidas en round-robin.
+
+    Un sitio con muchos enlaces (un directorio) no puede acaparar el rastreo:
+    cada dominio pendiente aporta una URL por vuelta.
+    """
+
+    def __init__(self, get_domain):
+        """
+        Args:
+            get_domain (function): Función url -> dominio usada para agrupar.
+        """
+        self.get_domain = get_domain
+        self._colas = {}
+        self._ronda = deque()
+        self._total = 0
+
+    def push(self, url, depth):
+        dominio = self.get_domain(url)
+        if dominio not in self._colas:
+            self._colas[dominio] = deque()
+            self._ronda.append(dominio)
+        self._colas[dominio].append((url, depth))
+        self._total += 1
+
+    def pop(self):
+        dominio = self._ronda.popleft()
+        cola = self._colas[dominio]
+        item = cola.popleft()
+        if cola:
+            self._ronda.append(dominio)
+        else:
+            del self._colas[dominio]
+        self._total -= 1
+        return item
+
+    def items(self):
+        return [item for dominio in self._ronda for item in self._colas[dominio]]
+
+    def __len__(self):
+        return self._total
+
+
+# Extensiones que no suelen tener texto útil para analizar
+EXTENSIONES_POBRES = (".pdf", ".jpg", ".jpeg", ".png", ".gif", ".zip", ".mp4", ".mp3", ".xml", ".css", ".js")
+
+
+def url_shape_penalty(url):
+    """
+    Penaliza URLs con forma de poco interés: rutas profundas, query strings,
+    paginación o archivos binarios. Devuelve un valor entre 0 y 4.
+    """
+    parsed = urlparse(url)
+    path = parsed.path.lower()
+    penalty = 0
+    segmentos = [s for s in path.split("/") if s]
+    if len(segmentos) > 3:
+        penalty += 1
+    if parsed.query:
+        penalty += 1
+    if "page=" in parsed.query.lower() or "/page/" in path:
+        penalty += 1
+    if path.endswith(EXTENSIONES_POBRES):
+        penalty += 1
+    return penalty
+
+
+def crear_frontier(tipo, crawler):
+    """
+    Crea la frontera de un crawler.
+
+    Args:
+        tipo (str | Frontier): "fifo", "prioridad", "dominio" o una instancia ya creada.
+        crawler (dcCrawler): Crawler dueño de la frontera (aporta dominios y cupos).
+    """
+    if isinstance(tipo, Frontier):
+        return tipo
+    if tipo == "fifo":
+        return FrontierFIFO()
+    if tipo == "prioridad":
+        return FrontierPrioridad(crawler.score_url)
+    if tipo == "dominio":
+        return FrontierPorDominio(crawler.get_domain)
+    raise ValueError(f"Tipo de frontera desconocido: {tipo}")
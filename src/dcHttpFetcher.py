@@ -0,0 +1,165 @@
+import re
+from urllib.parse import urljoin, urlparse
+import httpx
+import lxml.etree
+import lxml.html
+from dcProgresoBase import ProgresoBase
+
+# Contenedores típicos de aplicaciones que se renderizan con JavaScript
+RAICES_SPA = ("root", "app", "__next", "__nuxt", "svelte")
+ETIQUETAS_SIN_TEXTO = ("script", "style", "noscript", "template", "svg")
+# Etiquetas de bloque que en innerText terminan en salto de línea
+ETIQUETAS_BLOQUE = (
+    "p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6",
+    "section", "article", "header", "footer", "nav", "table", "ul", "ol",
+)
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
+)
+
+
+class dcHttpFetcher(ProgresoBase):
+    """
+    Nivel de descarga rápido por HTTP para páginas estáticas.
+
+    Descarga el HTML con un cliente httpx compartido y extrae enlaces y texto con
+    lxml. Si la página parece renderizarse con JavaScript devuelve None para que
+    el crawler recurra al navegador. Un dominio pasa a usar siempre el navegador
+    sólo con una señal clara de SPA o tras varias páginas seguidas casi sin
+    texto: una página corta suelta (un aviso, una redirección) se decide sola.
+    """
+
+    def __init__(self, min_text_chars=200, timeout=20, max_connections=20, browser_after=3):
+        """
+        Inicializa el fetcher.
+
+        Args:
+            min_text_chars (int): Texto mínimo para considerar la página estática.
+            timeout (float): Timeout en segundos de cada descarga.
+            max_connections (int): Conexiones simultáneas del pool HTTP.
+            browser_after (int): Páginas seguidas casi sin texto para pasar el dominio al navegador.
+        """
+        super().__init__()
+        self.min_text_chars = min_text_chars
+        self.browser_after = browser_after
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.tier = {}  # dominio -> "http" | "browser"
+        self.poco_texto = {}  # dominio -> páginas seguidas casi sin texto
+        self.http_ok = 0
+        self.escalated = 0
+        self._client = None
+
+    async def close(self):
+        """Cierra el cliente HTTP."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_domain(self, url):
+        return urlparse(url).netloc.lower()
+
+    async def fetch(self, url):
+        """
+        Descarga la URL por HTTP.
+
+        Returns:
+            tuple | None: (enlaces, texto), o None si hay que usar el navegador.
+        """
+        domain = self.get_domain(url)
+        if self.tier.get(domain) == "browser":
+            return None
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT},
+                limits=httpx.Limits(max_connections=self.max_connections),
+            )
+        try:
+            response = await self._client.get(url)
+        except httpx.HTTPError as e:
+            self.notificar_progreso(f"HTTP falló para {url}, se usará el navegador: {e}")
+            self.escalated += 1
+            return None
+
+        # Errores y bloqueos anti-bots se reintentan con el navegador
+        if response.status_code >= 400:
+            self.escalated += 1
+            return None
+
+        content_type = response.headers.get("content-type", "").lower()
+        if "html" not in content_type:
+            self.http_ok += 1
+            texto = response.text if content_type.startswith("text/") else ""
+            return [], texto
+
+        try:
+            doc = lxml.html.fromstring(response.content, base_url=str(response.url))
+        except lxml.etree.ParserError:
+            # Cuerpo vacío o solo comentarios: lo resuelve el navegador
+            self.escalated += 1
+            return None
+        # Se mira antes de extraer el texto, que descarta los <noscript>
+        noscript = bool(doc.xpath("//noscript"))
+        links = self.extract_links(doc, str(response.url))
+        texto = self.extract_text(doc)
+
+        motivo = self.looks_script_rendered(doc, texto, noscript)
+        if motivo:
+            self.escalated += 1
+            self.poco_texto[domain] = self.poco_texto.get(domain, 0) + 1
+            if motivo == "spa" or self.poco_texto[domain] >= self.browser_after:
+                self.tier[domain] = "browser"
+                self.notificar_progreso(f"{domain} requiere JavaScript, se usará el navegador")
+            return None
+
+        self.tier[domain] = "http"
+        self.poco_texto.pop(domain, None)
+        self.http_ok += 1
+        return links, texto
+
+    def extract_links(self, doc, base_url):
+        """Devuelve los enlaces absolutos válidos (mismo filtro que el crawler en el navegador)."""
+        links = []
+        for href in doc.xpath("//a/@href"):
+            href = href.strip()
+            if not href or href.startswith("#") or href.startswith("javascript:"):
+                continue
+            link = urljoin(base_url, href)
+            if "mailto:" in link or "tel:" in link:
+                continue
+            if urlparse(link).scheme in ("http", "https"):
+                links.append(link)
+        return links
+
+    def extract_text(self, doc):
+        """Texto visible aproximado del body, sin scripts ni estilos."""
+        body = doc.find("body")
+        if body is None:
+            body = doc
+        for elemento in list(body.iter(*ETIQUETAS_SIN_TEXTO)):
+            elemento.drop_tree()
+        for elemento in body.iter(*ETIQUETAS_BLOQUE):
+            elemento.tail = "\n" + (elemento.tail or "")
+        lineas = (re.sub(r"[ \t\r\f\v]+", " ", linea).strip() for linea in body.text_content().split("\n"))
+        return "\n".join(linea for linea in lineas if linea)
+
+    def looks_script_rendered(self, doc, texto, noscript=False):
+        """
+        Heurística para páginas que arma JavaScript.
+
+        Returns:
+            str | None: "spa" si hay un contenedor SPA vacío o sólo un aviso <noscript>
+                (vale para todo el dominio), "poco_texto" si sólo hay casi nada de texto
+                (puede ser una página corta), None si la página es estática.
+        """
+        for raiz in RAICES_SPA:
+            contenedor = doc.xpath(f'//div[@id="{raiz}"]')
+            if contenedor and not contenedor[0].text_content().strip():
+                return "spa"
+        if len(texto) < self.min_text_chars:
+            return "spa" if noscript else "poco_texto"
+        return None
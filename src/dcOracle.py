@@ -1,33 +1,462 @@
-from openai import OpenAI
+import asyncio
+import json
+import time
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
+from dcRateLimiter import is_transient
 import os
 
+SYSTEM_PROMPT = "Analiza el texto extraido de un sitio web y responde la consigna en forma clara y concisa"
+MULTI_SYSTEM_PROMPT = (
+    "Analiza el texto extraido de un sitio web y responde cada consigna en forma clara y concisa. "
+    "Responde sólo con un objeto JSON cuyas claves sean los ids numéricos de las consignas, "
+    "sin corchetes, y cuyos valores sean las respuestas en texto. "
+    'Por ejemplo, para las consignas [12] y [13]: {"12": "respuesta", "13": "respuesta"}.'
+)
+REDUCE_SYSTEM_PROMPT = (
+    "Recibes respuestas parciales a una consigna, cada una sobre una parte distinta del texto de un "
+    "sitio web. Combínalas en una única respuesta clara y concisa, sin repetir información."
+)
+
+
+class OracleError(Exception):
+    """
+    Error al consultar el modelo. Si es reintentable el par queda pendiente; si no,
+    se guarda marcado como error para que el batch pueda terminar.
+
+    Attributes:
+        reintentable (bool): Si el error es transitorio (429, 5xx, timeouts).
+    """
+
+    def __init__(self, mensaje, reintentable=False):
+        super().__init__(mensaje)
+        self.reintentable = reintentable
+
+
+def _valor(objeto, nombre):
+    """Atributo de un objeto del SDK o clave de un dict (resultados del endpoint de batches)."""
+    if isinstance(objeto, dict):
+        return objeto.get(nombre)
+    return getattr(objeto, nombre, None)
+
+
+class Uso:
+    """Tokens consumidos por una o más consultas al modelo."""
+
+    def __init__(self, prompt=0, cached=0, completion=0, consultas=0):
+        self.prompt = prompt
+        self.cached = cached
+        self.completion = completion
+        self.consultas = consultas
+
+    @classmethod
+    def desde_usage(cls, usage):
+        """Uso de una consulta a partir del `usage` de la respuesta."""
+        if usage is None:
+            return cls(consultas=1)
+        cached = _valor(_valor(usage, "prompt_tokens_details"), "cached_tokens") or 0
+        return cls(_valor(usage, "prompt_tokens") or 0, cached, _valor(usage, "completion_tokens") or 0, 1)
+
+    def __add__(self, otro):
+        return Uso(
+            self.prompt + otro.prompt,
+            self.cached + otro.cached,
+            self.completion + otro.completion,
+            self.consultas + otro.consultas,
+        )
+
+    def repartir(self, partes):
+        """Divide el uso en `partes` enteras que suman el total (el resto va a la primera)."""
+        if partes <= 0:
+            return []
+        usos = [
+            Uso(self.prompt // partes, self.cached // partes, self.completion // partes)
+            for _ in range(partes)
+        ]
+        usos[0] = Uso(
+            self.prompt - self.prompt // partes * (partes - 1),
+            self.cached - self.cached // partes * (partes - 1),
+            self.completion - self.completion // partes * (partes - 1),
+            self.consultas,
+        )
+        return usos
+
+    def __repr__(self):
+        return (
+            f"Uso(prompt={self.prompt}, cached={self.cached}, "
+            f"completion={self.completion}, consultas={self.consultas})"
+        )
+
+
+class Respuesta(str):
+    """
+    Texto de una respuesta del modelo con lo que costó obtenerla.
+
+    Se comporta como `str` (se cachea y se guarda igual que antes) y además
+    lleva `uso` (Uso), `modelo` y `latencia` (segundos de reloj, con reintentos).
+    Las respuestas que vienen de la caché tienen uso cero.
+    """
+
+    def __new__(cls, texto, uso=None, modelo=None, latencia=0.0):
+        respuesta = super().__new__(cls, texto)
+        respuesta.uso = uso if uso is not None else Uso()
+        respuesta.modelo = modelo
+        respuesta.latencia = latencia
+        return respuesta
+
+
+def sumar_uso(respuestas):
+    """Uso total de varias respuestas (las que no son `Respuesta` cuentan cero)."""
+    return sum((getattr(r, "uso", Uso()) for r in respuestas), Uso())
+
 
 class dcOracle:
-    def __init__(self):
+    def __init__(self, max_concurrency=8, cache=None, rate_limiter=None, budget=None, base_url=None):
         load_dotenv()
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # OPENAI_BASE_URL en el .env apunta el oráculo a otro servidor (ej. dcFakeServer)
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=self.base_url)
+        # Con limitador, los reintentos los maneja dcRateLimiter y no el cliente
+        self.async_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=self.base_url,
+            max_retries=0 if rate_limiter is not None else 2,
+        )
         self.engine = "gpt-4o-mini"
+        self.temperature = 0.3
+        # Consultas simultáneas como máximo en process_batch
+        self.max_concurrency = max_concurrency
+        # dcCache opcional: se consulta antes de llamar a la API
+        self.cache = cache
+        # dcRateLimiter opcional: límites RPM/TPM y reintentos con backoff
+        self.rate_limiter = rate_limiter
+        # dcTokens.ContentBudget opcional: recorta el texto o lo parte (map-reduce) por tokens
+        self.budget = budget
+        # Uso acumulado de todas las consultas hechas a la API (incluye las que fallaron al parsear)
+        self.uso_total = Uso()
+
+    async def close(self):
+        """Cierra el cliente asíncrono."""
+        await self.async_client.close()
+
+    def cache_key(self, system_prompt, prompt, text):
+        if self.cache is None:
+            return None
+        return self.cache.key(self.engine, self.temperature, system_prompt, prompt, text)
+
+    def build_messages(self, text, prompt):
+        return [
+            {
+                "role": "system",
+                "content": SYSTEM_PROMPT,
+            },
+            {"role": "user", "content": f"TEXTO WEB:\n{text}\n\nCONSIGNA:\n{prompt}"},
+        ]
+
+    def build_multi_messages(self, text, prompts):
+        consignas = "\n".join(f"[{prompt_id}] {prompt}" for prompt_id, prompt in prompts)
+        return [
+            {
+                "role": "system",
+                "content": MULTI_SYSTEM_PROMPT,
+            },
+            {"role": "user", "content": f"TEXTO WEB:\n{text}\n\nCONSIGNAS:\n{consignas}"},
+        ]
+
+    def build_reduce_messages(self, prompt, parciales):
+        partes = "\n\n".join(f"PARTE {i}:\n{parcial}" for i, parcial in enumerate(parciales, start=1))
+        return [
+            {
+                "role": "system",
+                "content": REDUCE_SYSTEM_PROMPT,
+            },
+            {"role": "user", "content": f"CONSIGNA:\n{prompt}\n\nRESPUESTAS PARCIALES:\n{partes}"},
+        ]
+
+    def repartir_uso(self, content, nuevas):
+        """Reparte el uso de una consulta multi-consigna entre las respuestas que trajo."""
+        usos = getattr(content, "uso", Uso()).repartir(len(nuevas))
+        modelo = getattr(content, "modelo", self.engine)
+        latencia = getattr(content, "latencia", 0.0)
+        return {
+            prompt_id: Respuesta(respuesta, uso, modelo, latencia)
+            for (prompt_id, respuesta), uso in zip(nuevas.items(), usos)
+        }
+
+    def split_text(self, text):
+        """Trozos del texto a consultar según el presupuesto (el texto entero si no hay)."""
+        if self.budget is None:
+            return [text]
+        return self.budget.split(text)
+
+    def parse_multi(self, content, prompts):
+        """Extrae del JSON de respuesta las respuestas por id; omite las faltantes o inválidas."""
+        try:
+            data = json.loads(content)
+        except (TypeError, ValueError):
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        # Se aceptan las claves con o sin los corchetes con que se listan las consignas
+        data = {str(clave).strip().strip("[]").strip(): valor for clave, valor in data.items()}
+        respuestas = {}
+        for prompt_id, _ in prompts:
+            valor = data.get(str(prompt_id))
+            if isinstance(valor, str) and valor.strip():
+                respuestas[prompt_id] = valor
+        return respuestas
 
     def process_web(self, text, prompt):
+        if self.budget is not None:
+            text = self.budget.fit(text)
+        clave = self.cache_key(SYSTEM_PROMPT, prompt, text)
+        if clave is not None:
+            respuesta = self.cache.get(clave)
+            if respuesta is not None:
+                return Respuesta(respuesta, modelo=self.engine)
         try:
+            inicio = time.monotonic()
             response = self.client.chat.completions.create(
                 model=self.engine,
-                temperature=0.3,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Analiza el texto extraido de un sitio web y responde la consigna en forma clara y concisa",
-                    },
-                    {"role": "user", "content": f"TEXTO WEB:\n{text}\n\nCONSIGNA:\n{prompt}"},
-                ],
+                temperature=self.temperature,
+                messages=self.build_messages(text, prompt),
             )
 
-            return response.choices[0].message.content
+            uso = Uso.desde_usage(response.usage)
+            self.uso_total += uso
+            respuesta = Respuesta(
+                response.choices[0].message.content, uso, response.model, time.monotonic() - inicio
+            )
+            if clave is not None:
+                self.cache.put(clave, respuesta)
+            return respuesta
 
         except Exception as e:
             return f"Error processing with GPT: {str(e)}"
 
+    async def chat_async(self, messages, **kwargs):
+        """
+        Consulta el modelo (a través del limitador, si hay) y devuelve el texto.
+
+        Returns:
+            Respuesta: El texto, con el uso de tokens, el modelo y la latencia.
+
+        Raises:
+            OracleError: Si la consulta falla; `reintentable` indica si fue transitorio.
+        """
+        def create():
+            return self.async_client.chat.completions.with_raw_response.create(
+                model=self.engine,
+                temperature=self.temperature,
+                messages=messages,
+                **kwargs,
+            )
+
+        inicio = time.monotonic()
+        try:
+            if self.rate_limiter is not None:
+                response = await self.rate_limiter.call(create, messages)
+            else:
+                response = (await create()).parse()
+        except Exception as e:
+            raise OracleError(f"Error processing with GPT: {str(e)}", is_transient(e)) from e
+        uso = Uso.desde_usage(response.usage)
+        self.uso_total += uso
+        return Respuesta(response.choices[0].message.content, uso, response.model, time.monotonic() - inicio)
+
+    async def process_web_async(self, text, prompt):
+        """
+        Versión asíncrona de `process_web`; no bloquea el loop de eventos.
+
+        Si el presupuesto parte el texto (map-reduce), responde cada trozo en
+        paralelo y combina las respuestas parciales en una consulta más.
+
+        Raises:
+            OracleError: Si la consulta falla (el error no se devuelve como respuesta).
+        """
+        partes = self.split_text(text)
+        if len(partes) == 1:
+            return await self._process_web_async(partes[0], prompt)
+        inicio = time.monotonic()
+        parciales = await asyncio.gather(*(self._process_web_async(parte, prompt) for parte in partes))
+        combinada = await self.combine_async(prompt, parciales)
+        return Respuesta(
+            combinada, sumar_uso(parciales + [combinada]), self.engine, time.monotonic() - inicio
+        )
+
+    async def combine_async(self, prompt, parciales):
+        """Combina las respuestas parciales (por trozo) a una consigna."""
+        clave = self.cache_key(REDUCE_SYSTEM_PROMPT, prompt, "\n\n".join(parciales))
+        if clave is not None:
+            respuesta = self.cache.get(clave)
+            if respuesta is not None:
+                return Respuesta(respuesta, modelo=self.engine)
+
+        respuesta = await self.chat_async(self.build_reduce_messages(prompt, parciales))
+        if clave is not None:
+            self.cache.put(clave, respuesta)
+        return respuesta
+
+    async def _process_web_async(self, text, prompt):
+        clave = self.cache_key(SYSTEM_PROMPT, prompt, text)
+        if clave is not None:
+            respuesta = self.cache.get(clave)
+            if respuesta is not None:
+                return Respuesta(respuesta, modelo=self.engine)
+
+        respuesta = await self.chat_async(self.build_messages(text, prompt))
+        if clave is not None:
+            self.cache.put(clave, respuesta)
+        return respuesta
+
+    async def process_web_multi_async(self, text, prompts):
+        """
+        Responde varias consignas sobre el mismo texto en una sola consulta.
+
+        El texto se envía una vez y se pide un JSON con una respuesta por id. Las
+        consignas que no vengan en el JSON (o si no se puede parsear) se resuelven
+        con consultas individuales.
+
+        Con map-reduce cada trozo se consulta con todas las consignas y las
+        respuestas parciales se combinan por consigna.
+
+        Args:
+            text (str): Texto del sitio.
+            prompts (list): Tuplas (id, consigna).
+
+        Returns:
+            dict: id -> respuesta, u OracleError para las consignas que fallaron.
+        """
+        partes = self.split_text(text)
+        if len(partes) == 1:
+            return await self._process_web_multi_async(partes[0], prompts)
+
+        inicio = time.monotonic()
+        por_parte = await asyncio.gather(*(self._process_web_multi_async(parte, prompts) for parte in partes))
+
+        async def combinar(prompt_id, prompt):
+            parciales = [respuestas[prompt_id] for respuestas in por_parte]
+            error = next((p for p in parciales if isinstance(p, OracleError)), None)
+            if error is not None:
+                return error
+            try:
+                combinada = await self.combine_async(prompt, parciales)
+            except OracleError as e:
+                return e
+            return Respuesta(
+                combinada, sumar_uso(parciales + [combinada]), self.engine, time.monotonic() - inicio
+            )
+
+        combinadas = await asyncio.gather(*(combinar(prompt_id, prompt) for prompt_id, prompt in prompts))
+        return {prompt_id: respuesta for (prompt_id, _), respuesta in zip(prompts, combinadas)}
+
+    async def _process_web_multi_async(self, text, prompts):
+        respuestas = {}
+        claves = {prompt_id: self.cache_key(MULTI_SYSTEM_PROMPT, prompt, text) for prompt_id, prompt in prompts}
+        if self.cache is not None:
+            for prompt_id, clave in claves.items():
+                respuesta = self.cache.get(clave)
+                if respuesta is not None:
+                    respuestas[prompt_id] = Respuesta(respuesta, modelo=self.engine)
+
+        a_consultar = [(prompt_id, prompt) for prompt_id, prompt in prompts if prompt_id not in respuestas]
+        if a_consultar:
+            try:
+                content = await self.chat_async(
+                    self.build_multi_messages(text, a_consultar),
+                    response_format={"type": "json_object"},
+                )
+            except OracleError as e:
+                # Si falló la consulta (no el JSON), consultar cada consigna sólo multiplica los errores
+                respuestas.update({prompt_id: e for prompt_id, _ in a_consultar})
+                return respuestas
+            nuevas = self.repartir_uso(content, self.parse_multi(content, a_consultar))
+            if self.cache is not None:
+                for prompt_id, respuesta in nuevas.items():
+                    self.cache.put(claves[prompt_id], respuesta)
+            respuestas.update(nuevas)
+
+        # Consignas que faltan o no se pudieron leer en el JSON: una consulta por cada una
+        faltantes = [(prompt_id, prompt) for prompt_id, prompt in prompts if prompt_id not in respuestas]
+        resultados = await asyncio.gather(
+            *(self._process_web_async(text, prompt) for _, prompt in faltantes), return_exceptions=True
+        )
+        for (prompt_id, _), respuesta in zip(faltantes, resultados):
+            if isinstance(respuesta, BaseException) and not isinstance(respuesta, OracleError):
+                raise respuesta
+            respuestas[prompt_id] = respuesta
+        return respuestas
+
+    async def process_batch(self, pares):
+        """
+        Procesa muchos pares en paralelo (hasta `max_concurrency` a la vez).
+
+        Args:
+            pares (iterable): Tuplas (clave, texto, prompt); puede ser asíncrono.
+
+        Yields:
+            tuple: (clave, respuesta) a medida que cada consulta termina; si falló,
+                la respuesta es el OracleError.
+        """
+        async for resultado in self._run_concurrently(pares, self.process_web_async):
+            yield resultado
+
+    async def process_batch_multi(self, sitios):
+        """
+        Como `process_batch`, pero con una consulta por sitio para todas sus consignas.
+
+        Args:
+            sitios (iterable): Tuplas (clave, texto, [(id, consigna), ...]); puede ser asíncrono.
+
+        Yields:
+            tuple: (clave, {id: respuesta}) a medida que cada sitio termina.
+        """
+        async for resultado in self._run_concurrently(sitios, self.process_web_multi_async):
+            yield resultado
+
+    @staticmethod
+    async def _items(items):
+        """Recorre igual un iterable normal o uno asíncrono (p. ej. páginas leídas de la base)."""
+        if hasattr(items, "__aiter__"):
+            async for item in items:
+                yield item
+        else:
+            for item in items:
+                yield item
+
+    async def _run_concurrently(self, items, funcion):
+        semaforo = asyncio.Semaphore(self.max_concurrency)
+
+        async def procesar(clave, *args):
+            async with semaforo:
+                try:
+                    return clave, await funcion(*args)
+                except OracleError as e:
+                    return clave, e
+
+        # Los items se leen a medida que hay lugar: nunca más de dos tandas en memoria
+        iterador = self._items(items)
+        agotado = False
+        tareas = set()
+        try:
+            while True:
+                while not agotado and len(tareas) < 2 * self.max_concurrency:
+                    try:
+                        item = await iterador.__anext__()
+                    except StopAsyncIteration:
+                        agotado = True
+                        break
+                    tareas.add(asyncio.ensure_future(procesar(*item)))
+                if not tareas:
+                    break
+                terminadas, tareas = await asyncio.wait(tareas, return_when=asyncio.FIRST_COMPLETED)
+                for tarea in terminadas:
+                    yield tarea.result()
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
+            await iterador.aclose()
 
 
 if __name__ == "__main__":
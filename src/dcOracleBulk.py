@@ -0,0 +1,248 @@
+import asyncio
+import hashlib
+import io
+import json
+import time
+from dcOracle import dcOracle, OracleError, Respuesta, Uso, SYSTEM_PROMPT, MULTI_SYSTEM_PROMPT
+from dcProgresoBase import ProgresoBase
+from dcRateLimiter import PERMANENT_CODES
+
+# Estados finales de un trabajo del endpoint de batches
+ESTADOS_FINALES = ("completed", "failed", "expired", "cancelled")
+
+
+class dcOracleBulk(dcOracle, ProgresoBase):
+    """
+    Backend del oráculo que usa el endpoint de batches (procesamiento diferido).
+
+    En vez de una consulta por par, escribe todas las consultas en un archivo
+    JSONL, lo sube, crea un único trabajo y consulta su estado hasta que
+    termina; luego lee el archivo de resultados. No tiene latencia interactiva
+    pero cuesta la mitad y no consume los límites RPM/TPM de las consultas
+    normales. Expone la misma interfaz que `dcOracle` (`process_batch` y
+    `process_batch_multi`), así que MainApp lo usa sin cambios.
+
+    El presupuesto de contenido se aplica recortando (`ContentBudget.fit`):
+    map-reduce necesitaría un segundo trabajo para combinar los trozos.
+    """
+
+    def __init__(self, cache=None, poll_interval=30.0, completion_window="24h", budget=None, base_url=None):
+        """
+        Args:
+            cache (dcCache): Caché opcional; sólo se envían las consultas que no estén en ella.
+            budget (ContentBudget): Presupuesto opcional de tokens del contenido.
+            base_url (str): URL de la API; por defecto OPENAI_BASE_URL del .env.
+            poll_interval (float): Segundos entre consultas del estado del trabajo.
+            completion_window (str): Ventana de finalización pedida al endpoint.
+        """
+        dcOracle.__init__(self, cache=cache, budget=budget, base_url=base_url)
+        ProgresoBase.__init__(self)
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+        # Id del trabajo en curso; si viene de un checkpoint se espera ese trabajo en vez de crear otro
+        self.bulk_id = None
+        self.on_submit = None
+
+    def registrar_envio(self, callback):
+        """Registra una corrutina `callback(bulk_id)` que se llama al crear el trabajo."""
+        self.on_submit = callback
+
+    def custom_id(self, body):
+        """Id de una consulta dentro del trabajo: hash del cuerpo, estable entre ejecuciones."""
+        return hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+
+    def build_body(self, messages, **kwargs):
+        return {"model": self.engine, "temperature": self.temperature, "messages": messages, **kwargs}
+
+    def write_jsonl(self, bodies):
+        """Arma el archivo JSONL de entrada con una línea por consulta (sin repetir ids)."""
+        archivo = io.BytesIO()
+        for custom_id, body in bodies.items():
+            linea = {"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body}
+            archivo.write(json.dumps(linea, ensure_ascii=False).encode("utf-8") + b"\n")
+        return archivo.getvalue()
+
+    async def submit(self, bodies):
+        """Sube el archivo de consultas y crea el trabajo. Devuelve su id."""
+        archivo = await self.async_client.files.create(
+            file=("consultas.jsonl", self.write_jsonl(bodies)), purpose="batch"
+        )
+        trabajo = await self.async_client.batches.create(
+            input_file_id=archivo.id,
+            endpoint="/v1/chat/completions",
+            completion_window=self.completion_window,
+        )
+        self.bulk_id = trabajo.id
+        self.notificar_progreso(f"Trabajo {trabajo.id} creado con {len(bodies)} consultas.")
+        if self.on_submit is not None:
+            await self.on_submit(trabajo.id)
+        return trabajo.id
+
+    async def wait(self, bulk_id):
+        """Consulta el estado del trabajo cada `poll_interval` segundos hasta que termina."""
+        while True:
+            trabajo = await self.async_client.batches.retrieve(bulk_id)
+            if trabajo.status in ESTADOS_FINALES:
+                return trabajo
+            conteo = trabajo.request_counts
+            if conteo is not None:
+                self.notificar_progreso(f"Trabajo {bulk_id}: {trabajo.status} ({conteo.completed}/{conteo.total})")
+            await asyncio.sleep(self.poll_interval)
+
+    async def fetch_results(self, trabajo, latencia=0.0):
+        """
+        Lee los archivos de salida y de errores del trabajo.
+
+        Args:
+            trabajo (Batch): El trabajo terminado.
+            latencia (float): Segundos desde el envío, que se asignan a cada respuesta.
+
+        Returns:
+            dict: custom_id -> Respuesta, u OracleError si la consulta falló.
+        """
+        resultados = {}
+        if trabajo.error_file_id:
+            contenido = await self.async_client.files.content(trabajo.error_file_id)
+            for linea in contenido.text.splitlines():
+                if linea.strip():
+                    item = json.loads(linea)
+                    resultados[item["custom_id"]] = self._error(item)
+        if trabajo.output_file_id:
+            contenido = await self.async_client.files.content(trabajo.output_file_id)
+            for linea in contenido.text.splitlines():
+                if not linea.strip():
+                    continue
+                item = json.loads(linea)
+                response = item.get("response") or {}
+                if item.get("error") or response.get("status_code") != 200:
+                    resultados[item["custom_id"]] = self._error(item)
+                else:
+                    body = response["body"]
+                    uso = Uso.desde_usage(body.get("usage"))
+                    self.uso_total += uso
+                    resultados[item["custom_id"]] = Respuesta(
+                        body["choices"][0]["message"]["content"], uso, body.get("model"), latencia
+                    )
+        return resultados
+
+    def _error(self, item):
+        error = item.get("error") or (item.get("response") or {}).get("body", {}).get("error") or {}
+        status = (item.get("response") or {}).get("status_code")
+        reintentable = (status is None or status == 429 or status >= 500) and error.get("code") not in PERMANENT_CODES
+        return OracleError(f"Error processing with GPT: {error.get('message', error)}", reintentable)
+
+    async def run_bulk(self, bodies):
+        """
+        Envía las consultas como un único trabajo (o espera el ya creado) y devuelve sus resultados.
+
+        Las consultas sin resultado (trabajo fallido, vencido o anterior a estas
+        consultas) se devuelven como OracleError reintentable.
+        """
+        if not bodies:
+            return {}
+        inicio = time.monotonic()
+        bulk_id = self.bulk_id or await self.submit(bodies)
+        trabajo = await self.wait(bulk_id)
+        resultados = await self.fetch_results(trabajo, time.monotonic() - inicio)
+        self.bulk_id = None
+        faltante = OracleError(f"Error processing with GPT: trabajo {bulk_id} {trabajo.status} sin resultado", True)
+        return {custom_id: resultados.get(custom_id, faltante) for custom_id in bodies}
+
+    async def process_batch(self, pares):
+        """
+        Procesa todos los pares en un único trabajo diferido.
+
+        Args:
+            pares (iterable): Tuplas (clave, texto, prompt); puede ser asíncrono.
+
+        Yields:
+            tuple: (clave, respuesta) cuando el trabajo termina; si falló, la respuesta es el OracleError.
+        """
+        listos, bodies, ids = [], {}, []
+        pares = [(clave, self.fit_text(text), prompt) async for clave, text, prompt in self._items(pares)]
+        for clave, text, prompt in pares:
+            respuesta = self._desde_cache(SYSTEM_PROMPT, prompt, text)
+            if respuesta is not None:
+                listos.append((clave, respuesta))
+                ids.append(None)
+                continue
+            body = self.build_body(self.build_messages(text, prompt))
+            custom_id = self.custom_id(body)
+            bodies[custom_id] = body
+            ids.append(custom_id)
+
+        for resultado in listos:
+            yield resultado
+
+        resultados = await self.run_bulk(bodies)
+        for (clave, text, prompt), custom_id in zip(pares, ids):
+            if custom_id is None:
+                continue
+            respuesta = resultados[custom_id]
+            if not isinstance(respuesta, OracleError):
+                self._a_cache(SYSTEM_PROMPT, prompt, text, respuesta)
+            yield clave, respuesta
+
+    async def process_batch_multi(self, sitios):
+        """
+        Como `process_batch`, con una consulta por sitio para todas sus consignas.
+
+        Las consignas que no vengan en el JSON de respuesta quedan como OracleError
+        reintentable (no se hace una consulta individual fuera del trabajo).
+
+        Args:
+            sitios (iterable): Tuplas (clave, texto, [(id, consigna), ...]); puede ser asíncrono.
+
+        Yields:
+            tuple: (clave, {id: respuesta}) cuando el trabajo termina.
+        """
+        sitios = [(clave, self.fit_text(text), prompts) async for clave, text, prompts in self._items(sitios)]
+        bodies, envios = {}, []
+        for clave, text, prompts in sitios:
+            respuestas = {}
+            for prompt_id, prompt in prompts:
+                respuesta = self._desde_cache(MULTI_SYSTEM_PROMPT, prompt, text)
+                if respuesta is not None:
+                    respuestas[prompt_id] = respuesta
+            a_consultar = [(prompt_id, prompt) for prompt_id, prompt in prompts if prompt_id not in respuestas]
+            custom_id = None
+            if a_consultar:
+                body = self.build_body(
+                    self.build_multi_messages(text, a_consultar), response_format={"type": "json_object"}
+                )
+                custom_id = self.custom_id(body)
+                bodies[custom_id] = body
+            envios.append((clave, text, prompts, a_consultar, respuestas, custom_id))
+
+        resultados = await self.run_bulk(bodies)
+        for clave, text, prompts, a_consultar, respuestas, custom_id in envios:
+            if custom_id is not None:
+                resultado = resultados[custom_id]
+                if isinstance(resultado, OracleError):
+                    nuevas = {}
+                else:
+                    nuevas = self.repartir_uso(resultado, self.parse_multi(resultado, a_consultar))
+                for prompt_id, prompt in a_consultar:
+                    if prompt_id in nuevas:
+                        self._a_cache(MULTI_SYSTEM_PROMPT, prompt, text, nuevas[prompt_id])
+                        respuestas[prompt_id] = nuevas[prompt_id]
+                    elif isinstance(resultado, OracleError):
+                        respuestas[prompt_id] = resultado
+                    else:
+                        respuestas[prompt_id] = OracleError(
+                            "Error processing with GPT: la consigna no vino en la respuesta", True
+                        )
+            yield clave, respuestas
+
+    def fit_text(self, text):
+        return self.budget.fit(text) if self.budget is not None else text
+
+    def _desde_cache(self, system_prompt, prompt, text):
+        clave = self.cache_key(system_prompt, prompt, text)
+        respuesta = self.cache.get(clave) if clave is not None else None
+        return Respuesta(respuesta, modelo=self.engine) if respuesta is not None else None
+
+    def _a_cache(self, system_prompt, prompt, text, respuesta):
+        clave = self.cache_key(system_prompt, prompt, text)
+        if clave is not None:
+            self.cache.put(clave, respuesta)
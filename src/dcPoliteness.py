@@ -0,0 +1,105 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+import httpx
+from protego import Protego
+from dcProgresoBase import ProgresoBase
+
+
+class dcPoliteness(ProgresoBase):
+    """
+    Planificador de cortesía por host.
+
+    Respeta una demora mínima y un máximo de cargas simultáneas por host, honra el
+    `Crawl-delay` y mantiene un robots.txt parseado (Protego) por host durante el
+    batch para descartar URLs prohibidas antes de abrir el navegador.
+    """
+
+    def __init__(self, min_delay=1.0, max_per_host=2, user_agent="*", respect_robots=True, max_crawl_delay=30.0):
+        """
+        Inicializa el planificador.
+
+        Args:
+            min_delay (float): Segundos mínimos entre dos cargas del mismo host.
+            max_per_host (int): Cargas simultáneas permitidas por host.
+            user_agent (str): Agente con el que se consultan las reglas de robots.txt.
+            respect_robots (bool): Si se descargan y aplican los robots.txt.
+            max_crawl_delay (float): Tope para `Crawl-delay` exagerados.
+        """
+        super().__init__()
+        self.min_delay = min_delay
+        self.max_per_host = max(1, max_per_host)
+        self.user_agent = user_agent
+        self.respect_robots = respect_robots
+        self.max_crawl_delay = max_crawl_delay
+        self.bloqueadas = 0  # URLs descartadas por robots.txt
+        self._robots = {}  # host -> tarea que resuelve a Protego (o None)
+        self._semaforos = {}
+        self._proxima_carga = {}
+        self._client = None
+
+    async def close(self):
+        """Cierra el cliente HTTP usado para descargar robots.txt."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_host(self, url):
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}".lower()
+
+    async def allowed(self, url):
+        """Indica si robots.txt permite rastrear la URL."""
+        if not self.respect_robots:
+            return True
+        robots = await self._get_robots(self.get_host(url))
+        if robots is None or robots.can_fetch(url, self.user_agent):
+            return True
+        self.bloqueadas += 1
+        self.notificar_progreso(f"{url} prohibida por robots.txt")
+        return False
+
+    def delay_for(self, host):
+        """Demora entre cargas del host: el mayor entre `min_delay` y su `Crawl-delay`."""
+        delay = self.min_delay
+        tarea = self._robots.get(host)
+        if tarea is not None and tarea.done() and not tarea.cancelled() and tarea.result() is not None:
+            crawl_delay = tarea.result().crawl_delay(self.user_agent)
+            if crawl_delay:
+                delay = max(delay, min(float(crawl_delay), self.max_crawl_delay))
+        return delay
+
+    @asynccontextmanager
+    async def turn(self, url):
+        """Espera el turno del host de la URL y ocupa uno de sus cupos de concurrencia."""
+        host = self.get_host(url)
+        if host not in self._semaforos:
+            self._semaforos[host] = asyncio.Semaphore(self.max_per_host)
+        async with self._semaforos[host]:
+            # Reserva el próximo horario libre del host antes de dormir
+            ahora = time.monotonic()
+            inicio = max(ahora, self._proxima_carga.get(host, ahora))
+            self._proxima_carga[host] = inicio + self.delay_for(host)
+            if inicio > ahora:
+                await asyncio.sleep(inicio - ahora)
+            yield
+
+    async def _get_robots(self, host):
+        tarea = self._robots.get(host)
+        if tarea is None or tarea.cancelled():
+            tarea = self._robots[host] = asyncio.ensure_future(self._download_robots(host))
+        # La descarga es compartida: cancelar a quien espera no la cancela para los demás
+        return await asyncio.shield(tarea)
+
+    async def _download_robots(self, host):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10, follow_redirects=True)
+        try:
+            response = await self._client.get(f"{host}/robots.txt")
+        except Exception as e:
+            self.notificar_progreso(f"No se pudo leer robots.txt de {host}: {e}")
+            return None
+        if response.status_code != 200:
+            return None
+        return Protego.parse(response.text)
@@ -0,0 +1,189 @@
+import asyncio
+import random
+import re
+import time
+import openai
+
+# Errores que vale la pena reintentar
+TRANSIENT_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# Un 429 con estos códigos no se resuelve esperando (la cuenta se quedó sin saldo)
+PERMANENT_CODES = ("insufficient_quota",)
+
+
+def is_transient(error):
+    return isinstance(error, TRANSIENT_ERRORS) and getattr(error, "code", None) not in PERMANENT_CODES
+
+
+def parse_duration(valor):
+    """Convierte duraciones de los headers de OpenAI ("1s", "6m0s", "20ms") a segundos."""
+    if not valor:
+        return None
+    try:
+        return float(valor)
+    except ValueError:
+        pass
+    total = 0.0
+    for numero, unidad in re.findall(r"([\d.]+)(ms|h|m|s)", valor):
+        total += float(numero) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unidad]
+    return total
+
+
+class TokenBucket:
+    """Balde de fichas que se recarga de forma continua a `por_minuto` fichas por minuto."""
+
+    def __init__(self, por_minuto):
+        self.capacidad = por_minuto
+        self.fichas = float(por_minuto)
+        self._ultimo = time.monotonic()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self.fichas = min(self.capacidad, self.fichas + (ahora - self._ultimo) * self.capacidad / 60)
+        self._ultimo = ahora
+
+    def espera(self, cantidad):
+        """Toma `cantidad` fichas si hay; si no, devuelve los segundos a esperar."""
+        self._recargar()
+        cantidad = min(cantidad, self.capacidad)
+        if self.fichas >= cantidad:
+            self.fichas -= cantidad
+            return 0
+        return (cantidad - self.fichas) * 60 / self.capacidad
+
+    async def acquire(self, cantidad=1):
+        espera = self.espera(cantidad)
+        while espera > 0:
+            await asyncio.sleep(espera)
+            espera = self.espera(cantidad)
+
+    def ajustar(self, cantidad):
+        """Descuenta (o devuelve, si es negativa) una diferencia de fichas ya tomadas."""
+        self.fichas -= cantidad
+
+    def sincronizar(self, limite, restante, reinicio):
+        """Ajusta el balde a los valores informados por los headers de la API."""
+        self._recargar()
+        if limite:
+            self.capacidad = limite
+        if restante is not None:
+            self.fichas = min(self.fichas, restante)
+            if restante <= 0 and reinicio:
+                # Sin cupo: el balde queda en negativo hasta el reinicio informado
+                self.fichas = -reinicio * self.capacidad / 60
+
+
+class dcRateLimiter:
+    """
+    Planificador de consultas al modelo con límites de solicitudes y tokens por minuto.
+
+    Mantiene un balde para RPM y otro para TPM (un poco por debajo de los límites
+    de la cuenta), los sincroniza con los headers `x-ratelimit-*` de cada
+    respuesta y reintenta errores transitorios (429, 5xx, timeouts) con espera
+    exponencial con jitter, respetando `retry-after`.
+    """
+
+    def __init__(self, rpm=500, tpm=200000, margin=0.9, max_retries=5, base_delay=1.0, max_delay=60.0):
+        """
+        Args:
+            rpm (int): Solicitudes por minuto de la cuenta.
+            tpm (int): Tokens por minuto de la cuenta.
+            margin (float): Fracción de los límites que se usa, para quedar justo por debajo.
+            max_retries (int): Reintentos ante errores transitorios.
+            base_delay (float): Espera base del backoff exponencial, en segundos.
+            max_delay (float): Espera máxima entre reintentos, en segundos.
+        """
+        self.margin = margin
+        self.requests = TokenBucket(rpm * margin)
+        self.tokens = TokenBucket(tpm * margin)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.reintentos = 0
+
+    def estimate_tokens(self, messages, max_output=500):
+        """Estimación de tokens de una consulta (~4 caracteres por token más la salida)."""
+        return sum(len(m["content"]) for m in messages) // 4 + max_output
+
+    async def acquire(self, tokens_estimados):
+        await self.requests.acquire(1)
+        await self.tokens.acquire(tokens_estimados)
+
+    def update_from_headers(self, headers):
+        def numero(nombre):
+            valor = headers.get(nombre)
+            try:
+                return float(valor) if valor is not None else None
+            except ValueError:
+                return None
+
+        limite = numero("x-ratelimit-limit-requests")
+        self.requests.sincronizar(
+            limite * self.margin if limite else None,
+            numero("x-ratelimit-remaining-requests"),
+            parse_duration(headers.get("x-ratelimit-reset-requests")),
+        )
+        limite = numero("x-ratelimit-limit-tokens")
+        self.tokens.sincronizar(
+            limite * self.margin if limite else None,
+            numero("x-ratelimit-remaining-tokens"),
+            parse_duration(headers.get("x-ratelimit-reset-tokens")),
+        )
+
+    def backoff(self, intento, error=None):
+        """Segundos a esperar antes del reintento `intento` (jitter completo o `retry-after`)."""
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after_ms = response.headers.get("retry-after-ms")
+            retry_after = response.headers.get("retry-after")
+            try:
+                if retry_after_ms:
+                    return float(retry_after_ms) / 1000
+                if retry_after:
+                    return float(retry_after)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** intento))
+
+    async def call(self, create, messages):
+        """
+        Ejecuta `create()` (una llamada `with_raw_response`) respetando los límites.
+
+        Args:
+            create (function): Corrutina sin argumentos que devuelve la respuesta cruda.
+            messages (list): Mensajes de la consulta, para estimar los tokens.
+
+        Returns:
+            La respuesta ya parseada.
+
+        Raises:
+            Exception: El último error si se agotan los reintentos o no es transitorio.
+        """
+        estimados = self.estimate_tokens(messages)
+        intento = 0
+        while True:
+            await self.acquire(estimados)
+            try:
+                raw = await create()
+            except Exception as e:
+                if not is_transient(e) or intento >= self.max_retries:
+                    raise
+                if isinstance(e, openai.RateLimitError):
+                    self.requests.sincronizar(None, 0, None)
+                espera = self.backoff(intento, e)
+                intento += 1
+                self.reintentos += 1
+                await asyncio.sleep(espera)
+                continue
+
+            self.update_from_headers(raw.headers)
+            response = raw.parse()
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                self.tokens.ajustar(usage.total_tokens - estimados)
+            return response
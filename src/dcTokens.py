@@ -0,0 +1,133 @@
+import functools
+
+try:
+    import tiktoken
+except ImportError:  # Sin tiktoken se estima con caracteres por token
+    tiktoken = None
+
+# Caracteres por token cuando no hay tokenizador disponible
+CHARS_POR_TOKEN = 4
+# Ventana de contexto por modelo, en tokens
+CONTEXTO_MODELO = {
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-3.5-turbo": 16385,
+}
+CONTEXTO_DEFAULT = 16385
+# Tokens reservados para el prompt de sistema, las consignas y la respuesta
+RESERVA = 4000
+ESTRATEGIAS = ("truncate", "head_tail", "map_reduce")
+# Marca entre el principio y el final del texto con "head_tail"
+SEPARADOR = "\n[...]\n"
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model):
+    if tiktoken is None:
+        return None
+    # El archivo del encoding se descarga la primera vez; sin red se estima
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+class Tokenizer:
+    """Cuenta y corta texto en tokens del modelo (tiktoken si está instalado)."""
+
+    def __init__(self, model):
+        self.model = model
+        self._enc = _encoding(model)
+
+    def encode(self, text):
+        if self._enc is None:
+            return text
+        return self._enc.encode(text, disallowed_special=())
+
+    def decode(self, tokens):
+        if self._enc is None:
+            return tokens
+        return self._enc.decode(tokens)
+
+    def count(self, text):
+        if self._enc is None:
+            return -(-len(text) // CHARS_POR_TOKEN)
+        return len(self.encode(text))
+
+    def _escala(self):
+        # Sin tokenizador cada "token" codificado es un caracter
+        return 1 if self._enc is not None else CHARS_POR_TOKEN
+
+    def head(self, text, max_tokens):
+        """Primeros `max_tokens` tokens del texto."""
+        return self.decode(self.encode(text)[:max_tokens * self._escala()])
+
+    def tail(self, text, max_tokens):
+        """Últimos `max_tokens` tokens del texto."""
+        if max_tokens <= 0:
+            return ""
+        return self.decode(self.encode(text)[-max_tokens * self._escala():])
+
+    def split(self, text, max_tokens, overlap=0):
+        """Parte el texto en trozos de hasta `max_tokens` tokens, solapados `overlap` tokens."""
+        escala = self._escala()
+        tokens = self.encode(text)
+        largo, paso = max_tokens * escala, max(1, max_tokens - overlap) * escala
+        return [self.decode(tokens[i:i + largo]) for i in range(0, max(len(tokens) - overlap * escala, 1), paso)]
+
+
+class ContentBudget:
+    """
+    Presupuesto de tokens del contenido enviado al modelo por consulta.
+
+    Estrategias:
+        truncate: conserva el principio del texto.
+        head_tail: conserva el principio y el final (2/3 y 1/3 del presupuesto).
+        map_reduce: parte el texto en hasta `max_chunks` trozos que se responden
+            por separado y después se combinan; lo que exceda se descarta.
+
+    El peor caso por sitio queda acotado por `max_tokens * max_chunks` más la
+    combinación de las respuestas parciales.
+    """
+
+    def __init__(self, model, max_tokens=1250, strategy="truncate", max_chunks=4, overlap=100):
+        """
+        Args:
+            model (str): Modelo, para elegir el tokenizador y la ventana de contexto.
+            max_tokens (int): Tokens de contenido por consulta (se limita a la ventana del modelo).
+            strategy (str): "truncate", "head_tail" o "map_reduce".
+            max_chunks (int): Máximo de trozos por sitio con "map_reduce".
+            overlap (int): Tokens compartidos entre trozos consecutivos.
+        """
+        if strategy not in ESTRATEGIAS:
+            raise ValueError(f"Estrategia de contenido desconocida: {strategy}")
+        self.tokenizer = Tokenizer(model)
+        self.max_tokens = min(max_tokens, CONTEXTO_MODELO.get(model, CONTEXTO_DEFAULT) - RESERVA)
+        self.strategy = strategy
+        self.max_chunks = max_chunks
+        self.overlap = min(overlap, self.max_tokens // 4)
+
+    def fit(self, text):
+        """Recorta el texto a una sola consulta según la estrategia ("map_reduce" conserva el principio)."""
+        text = text or ""
+        if self.tokenizer.count(text) <= self.max_tokens:
+            return text
+        if self.strategy == "head_tail":
+            cabeza = self.max_tokens * 2 // 3
+            cola = self.max_tokens - cabeza - self.tokenizer.count(SEPARADOR)
+            return self.tokenizer.head(text, cabeza) + SEPARADOR + self.tokenizer.tail(text, cola)
+        return self.tokenizer.head(text, self.max_tokens)
+
+    def split(self, text):
+        """Trozos a consultar por separado: uno solo salvo con "map_reduce" y texto largo."""
+        text = text or ""
+        if self.strategy != "map_reduce" or self.tokenizer.count(text) <= self.max_tokens:
+            return [self.fit(text)]
+        return self.tokenizer.split(text, self.max_tokens, self.overlap)[:self.max_chunks]
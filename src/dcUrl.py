@@ -0,0 +1,178 @@
+import base64
+import hashlib
+import math
+import posixpath
+from urllib.parse import urlsplit, urlunsplit, unquote_plus
+import tldextract
+
+# Parámetros de seguimiento que no cambian el contenido de la página
+TRACKING_PREFIXES = ("utm_",)
+TRACKING_PARAMS = frozenset(
+    ("fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "_ga", "_gl", "_hsenc", "_hsmi")
+)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Usa la lista de sufijos incluida en el paquete, sin descargas ni caché en disco
+_tld = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+
+
+def canonicalize(url):
+    """
+    Devuelve la forma canónica de una URL para comparar páginas.
+
+    Pasa a minúsculas el esquema y el host (la ruta conserva mayúsculas), quita
+    el fragmento, el puerto por defecto, los parámetros de seguimiento (`utm_*`,
+    `fbclid`, ...) y la barra final, resuelve `.`/`..` y ordena el query string.
+    El resultado es la URL que se descarga, así que no cambia su significado:
+    los parámetros se conservan tal como vienen (`?123` no pasa a `?123=`) y
+    también el usuario y la contraseña.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or "").lower()
+        port = parts.port
+    except ValueError:
+        return url
+
+    # Los hosts IPv6 van entre corchetes (hostname los quita)
+    netloc = f"[{host}]" if ":" in host else host
+    if port and DEFAULT_PORTS.get(scheme) != port:
+        netloc = f"{netloc}:{port}"
+    userinfo, arroba, _ = parts.netloc.rpartition("@")
+    if arroba:
+        netloc = f"{userinfo}@{netloc}"
+
+    path = parts.path or "/"
+    if "/." in path:
+        path = posixpath.normpath(path) + ("/" if path.endswith("/") else "")
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/") or "/"
+
+    # Orden estable por clave: los valores de una clave repetida conservan su orden
+    query = sorted(
+        (parametro for parametro in parts.query.split("&") if parametro and not _es_seguimiento(parametro)),
+        key=lambda parametro: parametro.split("=", 1)[0],
+    )
+
+    return urlunsplit((scheme, netloc, path, "&".join(query), ""))
+
+
+def _es_seguimiento(parametro):
+    """Si un parámetro del query string (`clave=valor`, sin decodificar) es de seguimiento."""
+    clave = unquote_plus(parametro.split("=", 1)[0]).lower()
+    return clave in TRACKING_PARAMS or clave.startswith(TRACKING_PREFIXES)
+
+
+def registered_domain(url):
+    """Dominio registrado (ej. `shop.example.co.uk` -> `example.co.uk`); el host si no aplica."""
+    host = (urlsplit(url).hostname or "").lower()
+    if not host:
+        return ""
+    return _tld.extract_str(host).registered_domain or host
+
+
+def fingerprint(url):
+    """Huella de 64 bits de una URL (ya canónica)."""
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class FingerprintSet:
+    """
+    Conjunto de URLs visitadas guardado como huellas de 64 bits.
+
+    Ocupa mucho menos que las URLs completas; la probabilidad de colisión es
+    despreciable para crawls de millones de páginas. Al iterar devuelve huellas.
+    """
+
+    def __init__(self, huellas=()):
+        self._huellas = set(huellas)
+
+    def add(self, url):
+        self._huellas.add(fingerprint(url))
+
+    def __contains__(self, url):
+        return fingerprint(url) in self._huellas
+
+    def __len__(self):
+        return len(self._huellas)
+
+    def __iter__(self):
+        return iter(self._huellas)
+
+
+class BloomSet:
+    """
+    Conjunto de URLs visitadas sobre un filtro de Bloom de tamaño fijo.
+
+    La memoria queda acotada por `capacidad` y `error`; puede dar falsos positivos
+    (una URL nueva se toma como visitada) pero nunca falsos negativos.
+    """
+
+    def __init__(self, capacidad=1_000_000, error=0.001):
+        self.bits = max(8, int(-capacidad * math.log(error) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.bits / capacidad * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+        self._cantidad = 0
+
+    def _posiciones(self, url):
+        digest = hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, url):
+        nuevo = False
+        for pos in self._posiciones(url):
+            byte, bit = divmod(pos, 8)
+            if not self._array[byte] & (1 << bit):
+                self._array[byte] |= 1 << bit
+                nuevo = True
+        if nuevo:
+            self._cantidad += 1
+
+    def __contains__(self, url):
+        return all(self._array[pos // 8] & (1 << (pos % 8)) for pos in self._posiciones(url))
+
+    def __len__(self):
+        return self._cantidad
+
+
+def crear_visited(tipo):
+    """Crea el conjunto de visitadas: "set" (URLs completas), "fingerprint" o "bloom"."""
+    if tipo == "set":
+        return set()
+    if tipo == "fingerprint":
+        return FingerprintSet()
+    if tipo == "bloom":
+        return BloomSet()
+    raise ValueError(f"Tipo de conjunto de visitadas desconocido: {tipo}")
+
+
+def visited_to_state(visited):
+    """Serializa un conjunto de visitadas a un dict apto para JSON (checkpoints)."""
+    if isinstance(visited, FingerprintSet):
+        return {"tipo": "fingerprint", "datos": list(visited)}
+    if isinstance(visited, BloomSet):
+        return {
+            "tipo": "bloom",
+            "bits": visited.bits,
+            "hashes": visited.hashes,
+            "cantidad": visited._cantidad,
+            "datos": base64.b64encode(bytes(visited._array)).decode("ascii"),
+        }
+    return {"tipo": "set", "datos": list(visited)}
+
+
+def visited_from_state(estado):
+    """Reconstruye un conjunto de visitadas serializado con `visited_to_state`."""
+    if estado["tipo"] == "fingerprint":
+        return FingerprintSet(estado["datos"])
+    if estado["tipo"] == "bloom":
+        visited = BloomSet()
+        visited.bits = estado["bits"]
+        visited.hashes = estado["hashes"]
+        visited._cantidad = estado["cantidad"]
+        visited._array = bytearray(base64.b64decode(estado["datos"]))
+        return visited
+    return set(estado["datos"])
@@ -12,7 +12,7 @@ class BatchConsole(tk.Toplevel):
     Autor: diego.cofre@gmail.com 
     12-2024, BUE, Argentina, 3ra roca desde el Sol, Vía Láctea
     """
-    def __init__(self, master, app: MainApp, batch: Batch):
+    def __init__(self, master, app: MainApp, batch: Batch, reanudar: bool = False):
         super().__init__(master)
         self.title("Consola de Batch")
         self.geometry("800x700")
@@ -69,6 +69,7 @@ class BatchConsole(tk.Toplevel):
 
         # Parámetros del batch
         self.batch = batch
+        self.reanudar = reanudar
         self.app = app
         self.task = None
         self.app.registrar_notificador(self.write_to_console)
@@ -89,7 +90,10 @@ class BatchConsole(tk.Toplevel):
         """Método asincrónico para iniciar el procesamiento del batch."""
         try:
             self.console_text.delete("1.0", tk.END) 
-            await self.app.init_batch(self.batch)
+            if self.reanudar:
+                await self.app.resume_batch(self.batch.id)
+            else:
+                await self.app.init_batch(self.batch)
         except asyncio.CancelledError:
             print("Task was cancelled")
 
@@ -99,38 +99,69 @@ class BatchView(tk.Toplevel):
         """
         Carga los detalles del batch y los muestra en la ventana.
 
+        Los sitios, sus textos y sus respuestas se leen de a una página.
+
         Args:
             batch_id (int): El ID del batch a cargar.
         """
-        batch : Batch = await self.app.get_batch_by_id(batch_id, eagger=True)   
-        sites : List[BatchSite] = batch.batch_sites
-        prompts : List[BatchPrompt] = batch.batch_prompts
-        respuestas : List[BatchPromptResponse] = await self.app.get_batchresponses(batch_id)
-        report = f"📦 BATCH #{batch.id} {batch.url_inicial.upper()}\n\n"
-        report += f"📅 Fecha Inicio: {format_date(batch.fecha_creado)}\t\t\t Fecha Fin: {format_date(batch.fecha_terminado)}\n"
-        report += f"📑 Sitios Analizados: {len(sites)}\t\t\tProfundidad: {batch.profundidad}\t\t\tCaracteres: {batch.caracteres}\n"
-        
+        batch : Batch = await self.app.get_batch_by_id(batch_id)
+        prompts : List[BatchPrompt] = await self.app.get_batch_prompts(batch_id)
+        stats = await self.app.get_response_stats(batch_id)
+
         numero = 1
-        for site in sites:
-            report += f"_"*50 + "\n"
-            report += f"🔗 {numero}. {site.url}\n\n"            
-            for prompt in prompts:
-                report += f"• PROMPT: {prompt.prompt}\n"
+        after_id = None
+        while sites := await self.app.get_batch_sites_page(batch_id, after_id):
+            textos = await self.app.get_site_texts(sites)
+            respuestas = {
+                (r.batch_site_id, r.batch_prompt_id): r
+                for r in await self.app.get_site_responses([site.id for site in sites])
+            }
+            report = ""
+            for site in sites:
+                report += f"_"*50 + "\n"
+                report += f"🔗 {numero}. {site.url}\n\n"
+                for prompt in prompts:
+                    report += f"• PROMPT: {prompt.prompt}\n"
+                    if (site.id, prompt.id) in respuestas:
+                        r = respuestas[(site.id, prompt.id)]
+                        report += f"• {'ERROR' if r.error else 'RESPUESTA'}: {r.respuesta}\n"
+                    report += "\n"
 
-                # Buscar respuesta correspondiente  
-                for respuesta in respuestas:
-                    if respuesta.batch_site_id == site.id and respuesta.batch_prompt_id == prompt.id:
-                        report += f"• RESPUESTA: {respuesta.respuesta}\n"
-                        break
-                report += "\n"
-            
-            report += f"\n📄 CONTENIDO:\n{site.contenido}\n\n"
-            numero += 1
+                report += f"\n📄 CONTENIDO:\n{textos[site.id]}\n\n"
+                numero += 1
+            self.report_text.insert(tk.END, report)
+            after_id = sites[-1].id
 
-        # Mostrar informe en el widget de texto
-        self.report_text.insert(tk.END, report)
+        # El encabezado va al principio, con la cantidad de sitios ya contada
+        report = f"📦 BATCH #{batch.id} {batch.url_inicial.upper()}\n\n"
+        report += f"📅 Fecha Inicio: {format_date(batch.fecha_creado)}\t\t\t Fecha Fin: {format_date(batch.fecha_terminado)}\n"
+        report += f"📑 Sitios Analizados: {numero - 1}\t\t\tProfundidad: {batch.profundidad}\t\t\tCaracteres: {batch.caracteres}\n"
+        report += self.usage_summary(batch, stats)
+        self.report_text.insert("1.0", report)
         self.report_text.config(state=tk.DISABLED)
 
+    def usage_summary(self, batch: Batch, stats):
+        """
+        Resumen del uso del modelo: totales del batch y promedios por respuesta
+        (sólo las que costaron tokens, sin caché ni duplicados).
+
+        Args:
+            stats (dict): El resumen de data.get_response_stats.
+        """
+        summary = (
+            f"🧮 Consultas: {batch.consultas}\t\t\tTokens entrada: {batch.tokens_prompt} "
+            f"({batch.tokens_cached} en caché)\t\t\tTokens salida: {batch.tokens_completion}\n"
+        )
+        summary += f"⏱ Tiempo de análisis: {batch.segundos_analisis:.0f} s"
+        if stats["con_costo"]:
+            summary += (
+                f"\t\t\tLatencia media: {stats['latencia']:.1f} s\t\t\t"
+                f"Tokens por respuesta: {stats['tokens_prompt']:.0f} + {stats['tokens_completion']:.0f}"
+            )
+        summary += f"\n🤖 Modelo: {', '.join(stats['modelos']) or '-'}\t\t\t"
+        summary += f"Respuestas con costo: {stats['con_costo']}/{stats['respuestas']}\n"
+        return summary
+
 # Ejemplo de uso
 if __name__ == "__main__":
     root = tk.Tk()
@@ -3,9 +3,11 @@ import tkinter as tk
 from ttkbootstrap.constants import *
 from gui_batch_view import BatchView
 from gui_nuevo_batch import NuevoBatch
+from gui_batch_console import BatchConsole
 from mainApp import *
 from data import Batch
 import asyncio
+import time
 
 class Historicos(tk.Toplevel):
     """
@@ -25,9 +27,20 @@ class Historicos(tk.Toplevel):
         super().__init__(master)
         self.app = app
         self.title("Históricos de Batches")
-        self.geometry("900x500")
+        self.geometry("900x720")
         self.resizable(False, False)
 
+        # Búsqueda en el contenido de los sitios y en las respuestas
+        search_frame = ttk.Frame(self, padding=(0, 5))
+        search_frame.pack(fill=X)
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
+        search_entry.pack(side=LEFT, fill=X, expand=True, padx=5)
+        search_entry.bind("<Return>", lambda event: self.buscar())
+        ttk.Button(search_frame, text="Buscar", style="info.TButton", command=self.buscar).pack(side=LEFT, padx=5)
+        self.search_status = ttk.Label(search_frame, text="", width=36)
+        self.search_status.pack(side=LEFT, padx=5)
+
         # Crear un contenedor para la tabla y el scrollbar
         frame = ttk.Frame(self)
         frame.pack(expand=True, fill=BOTH)
@@ -36,7 +49,10 @@ class Historicos(tk.Toplevel):
         style = ttk.Style()
 
         # Crear la tabla con Treeview
-        columnas = ("ID", "URL", "Fecha", "Reiniciar", "Ver")
+        columnas = (
+            "ID", "URL", "Fecha", "Estado", "Sitios", "Respuestas", "Errores", "Duracion",
+            "Reiniciar", "Ver", "Reanudar",
+        )
         self.tree = ttk.Treeview(
             frame, columns=columnas, show="headings", height=10, style="info.Treeview"
         )
@@ -47,60 +63,157 @@ class Historicos(tk.Toplevel):
             frame, orient="vertical", command=self.tree.yview, style="info.Vertical.TScrollbar"
         )
         scrollbar.pack(side=RIGHT, fill=Y)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.configure(yscrollcommand=lambda first, last: self.on_tree_scroll(scrollbar, first, last))
 
         # Definir encabezados de las columnas
         self.tree.heading("ID", text="ID")
         self.tree.heading("URL", text="Url Inicial", anchor=W)
         self.tree.heading("Fecha", text="Fecha Hora")
+        self.tree.heading("Estado", text="Estado")
+        self.tree.heading("Sitios", text="Analizados")
+        self.tree.heading("Respuestas", text="Respuestas")
+        self.tree.heading("Errores", text="Errores")
+        self.tree.heading("Duracion", text="Duración")
         self.tree.heading("Reiniciar", text="")
         self.tree.heading("Ver", text="")
+        self.tree.heading("Reanudar", text="")
 
         # Ajustar ancho de las columnas para el nuevo tamaño de fuente
-        self.tree.column("ID", width=60, anchor=CENTER)
-        self.tree.column("URL", width=550, anchor=W)
-        self.tree.column("Fecha", width=150, anchor=CENTER)
+        self.tree.column("ID", width=50, anchor=CENTER)
+        self.tree.column("URL", width=300, anchor=W)
+        self.tree.column("Fecha", width=110, anchor=CENTER)
+        self.tree.column("Estado", width=85, anchor=CENTER)
+        self.tree.column("Sitios", width=75, anchor=CENTER)
+        self.tree.column("Respuestas", width=70, anchor=CENTER)
+        self.tree.column("Errores", width=55, anchor=CENTER)
+        self.tree.column("Duracion", width=70, anchor=CENTER)
         self.tree.column("Reiniciar", width=15, anchor=CENTER)
         self.tree.column("Ver", width=15, anchor=CENTER)
+        self.tree.column("Reanudar", width=15, anchor=CENTER)
 
         # Eliminar la carga de imágenes y reemplazar con estilos
         style.configure("success.SmallButton", padding=2)
         style.configure("info.SmallButton", padding=2)
 
-        # Cargar datos históricos
-        self.load_historicos()
-
         # Configurar colores según el estado
-        # self.tree.tag_configure("completado", foreground="green")
-        # self.tree.tag_configure("error", foreground="red")
-        # self.tree.tag_configure("pendiente", foreground="orange")
+        self.tree.tag_configure("completado", foreground="green")
+        self.tree.tag_configure("error", foreground="red")
+        self.tree.tag_configure("pendiente", foreground="orange")
+        self.tree.tag_configure("en_curso", foreground="blue")
+
+        # Cargar datos históricos de a una página; las siguientes al llegar al final de la tabla
+        self.page_size = 100
+        self.ultimo_id = None
+        self.hay_mas = True
+        self.load_historicos()
 
         # Vincular eventos
         self.tree.bind("<ButtonRelease-1>", self.on_tree_select)
 
+        # Resultados de la búsqueda; un click abre el batch
+        results_frame = ttk.Frame(self)
+        results_frame.pack(expand=True, fill=BOTH, pady=(5, 0))
+        columnas_resultados = ("Batch", "Tipo", "Origen", "Fragmento")
+        self.results = ttk.Treeview(
+            results_frame, columns=columnas_resultados, show="headings", height=8, style="info.Treeview"
+        )
+        self.results.pack(side=LEFT, fill=BOTH, expand=True)
+        results_scrollbar = ttk.Scrollbar(
+            results_frame, orient="vertical", command=self.results.yview, style="info.Vertical.TScrollbar"
+        )
+        results_scrollbar.pack(side=RIGHT, fill=Y)
+        self.results.configure(yscrollcommand=results_scrollbar.set)
+        self.results.heading("Batch", text="Batch")
+        self.results.heading("Tipo", text="En")
+        self.results.heading("Origen", text="Url / Prompt", anchor=W)
+        self.results.heading("Fragmento", text="Fragmento", anchor=W)
+        self.results.column("Batch", width=60, anchor=CENTER)
+        self.results.column("Tipo", width=80, anchor=CENTER)
+        self.results.column("Origen", width=220, anchor=W)
+        self.results.column("Fragmento", width=515, anchor=W)
+        self.results.bind("<ButtonRelease-1>", self.on_result_select)
+
     def load_historicos(self):
         """
-        Carga los datos históricos de batches en la tabla.
+        Carga la siguiente página de batches históricos en la tabla.
         """
-        datos_historicos = asyncio.run(self.app.get_batches_historicos())
+        if not self.hay_mas:
+            return
+        datos_historicos = asyncio.run(self.app.get_batches_historicos(self.ultimo_id, self.page_size))
+        self.hay_mas = len(datos_historicos) == self.page_size
+        if datos_historicos:
+            self.ultimo_id = datos_historicos[-1].id
 
         # Agregar datos a la tabla con botones estilizados
         for batch in datos_historicos:
             id_ = batch.id
             url = batch.url_inicial
             fecha = batch.fecha_creado.strftime("%d-%m-%y %H:%M")
+            # Resumen que mantiene el pipeline: no hace falta leer sitios ni respuestas
+            sitios = f"{batch.sitios_analizados}/{batch.sitios_rastreados}"
+            duracion = f"{int(batch.duracion // 60)}:{int(batch.duracion % 60):02d}"
 
             # Crear botones estilizados para cada fila
             reiniciar_btn = "↻"  # Símbolo de reinicio
             ver_btn = "👁"  # Símbolo de ojo
+            # Sólo los batches sin terminar se pueden reanudar
+            # (ni los que se están ejecutando en otra consola)
+            reanudar_btn = "⏯" if batch.estado != "completado" and not self.app.is_running(batch.id) else ""
 
             self.tree.insert(
                 "",
                 "end",
-                values=(id_, url, fecha, reiniciar_btn, ver_btn),
-                # tags=(estado.lower(),)  # Usar el estado como tag para colorear
+                values=(
+                    id_, url, fecha, batch.estado.replace("_", " "), sitios, batch.respuestas,
+                    batch.errores, duracion, reiniciar_btn, ver_btn, reanudar_btn,
+                ),
+                tags=(batch.estado,),  # Usar el estado como tag para colorear
             )
 
+    def on_tree_scroll(self, scrollbar, first, last):
+        """
+        Actualiza el scrollbar y carga la siguiente página al llegar al final de la tabla.
+        """
+        scrollbar.set(first, last)
+        if float(last) >= 1.0 and self.hay_mas:
+            self.after_idle(self.load_historicos)
+
+    def buscar(self):
+        """
+        Busca el texto ingresado y muestra primero los sitios y después las
+        respuestas, cada grupo ordenado por relevancia.
+        """
+        self.results.delete(*self.results.get_children())
+        consulta = self.search_var.get().strip()
+        if not consulta:
+            self.search_status.configure(text="")
+            return
+        inicio = time.perf_counter()
+        resultados = asyncio.run(self.app.search(consulta))
+        milisegundos = (time.perf_counter() - inicio) * 1000
+        self.search_status.configure(
+            text=f"{len(resultados['sitio'])} sitios y {len(resultados['respuesta'])} respuestas "
+            f"en {milisegundos:.0f} ms"
+        )
+        for resultado in resultados["sitio"] + resultados["respuesta"]:
+            origen = resultado.url if resultado.tipo == "sitio" else f"{resultado.prompt} ({resultado.url})"
+            self.results.insert(
+                "",
+                "end",
+                values=(resultado.batch_id, resultado.tipo, origen, resultado.fragmento),
+            )
+
+    def on_result_select(self, event):
+        """
+        Abre el batch del resultado de búsqueda seleccionado.
+
+        Args:
+            event (tk.Event): El evento de selección.
+        """
+        values = self.results.item(self.results.focus(), "values")
+        if values:
+            BatchView(self, self.app, values[0])
+
     def on_tree_select(self, event):
         """
         Maneja la selección de un elemento en la tabla.
@@ -112,13 +225,16 @@ class Historicos(tk.Toplevel):
         values = self.tree.item(selected_item, "values")
         if values:
             column_clicked = self.tree.identify_column(event.x)
-            if column_clicked == "#4":  # Columna Reiniciar
+            if column_clicked == "#9":  # Columna Reiniciar
                 batch = asyncio.run(self.app.get_batch_by_id(values[0], eagger=True))
 
                 NuevoBatch(self, self.app, batch)
-            elif column_clicked == "#5":  # Columna Ver
+            elif column_clicked == "#10":  # Columna Ver
                 batch_id = values[0]
                 BatchView(self, self.app, batch_id)
+            elif column_clicked == "#11" and values[10] and not self.app.is_running(values[0]):  # Columna Reanudar
+                batch = asyncio.run(self.app.get_batch_by_id(values[0]))
+                BatchConsole(self, self.app, batch, reanudar=True)
 
 # Ejemplo de uso
 if __name__ == "__main__":
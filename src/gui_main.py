@@ -1,3 +1,6 @@
+import asyncio
+import threading
+from tkinter import messagebox
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 from gui_historicos import Historicos
@@ -23,7 +26,7 @@ def main():
     # Crear la ventana principal
 
     root.title("Crawler GPT")
-    root.geometry("400x300")
+    root.geometry("400x360")
     root.resizable(False, False)
 
     # Crear un marco principal para centrar los botones
@@ -53,6 +56,12 @@ def main():
     )
     btn_ver_historicos.pack(fill=X, pady=10)  # Botón 2
 
+    btn_compactar = ttk.Button(
+        frame, text="Compactar Base", style="success.TButton",
+        command=lambda: compactar_base(root, app, btn_compactar)
+    )
+    btn_compactar.pack(fill=X, pady=10)
+
     btn_salir = ttk.Button(
         frame, text="Salir", style="danger.TButton", command=root.quit
     )
@@ -62,6 +71,36 @@ def main():
     # Iniciar el loop principal
     root.mainloop()
 
+def compactar_base(root, app: MainApp, boton):
+    """
+    Compacta la base en un hilo aparte (migra y recomprime los textos y hace VACUUM)
+    y avisa el resultado al terminar.
+    """
+    if not messagebox.askyesno(
+        "Compactar Base",
+        "Se recomprimirán los textos guardados y se liberará el espacio libre. "
+        "Puede tardar varios minutos. ¿Continuar?",
+    ):
+        return
+    boton.configure(state=DISABLED, text="Compactando...")
+
+    def compactar():
+        try:
+            resultado = asyncio.run(app.compact_storage())
+            if resultado is None:
+                mensaje = "Hay batches en ejecución. Vuelva a intentarlo cuando terminen."
+            else:
+                mensaje = f"{resultado[0]} sitios migrados y {resultado[1]} textos recomprimidos."
+        except Exception as e:
+            mensaje = f"Error al compactar la base: {e}"
+        root.after(0, lambda: terminar(mensaje))
+
+    def terminar(mensaje):
+        boton.configure(state=NORMAL, text="Compactar Base")
+        messagebox.showinfo("Compactar Base", mensaje)
+
+    threading.Thread(target=compactar, daemon=True).start()
+
 def setStyle():
     """
     Configura los estilos de los widgets de la aplicación.
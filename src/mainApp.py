@@ -1,8 +1,16 @@
 import asyncio
 import datetime
+import threading
+import time
 from typing import List
 from dcCrawler import dcCrawler
-from dcOracle import dcOracle
+from dcBrowserPool import ResourcePolicy
+from dcOracle import dcOracle, OracleError, Respuesta
+from dcOracleBulk import dcOracleBulk
+from dcRateLimiter import dcRateLimiter
+from dcDuplicados import DetectorDuplicados
+from dcCache import dcCache
+from dcTokens import ContentBudget, CHARS_POR_TOKEN
 import data
 from dcProgresoBase import print_ts, ProgresoBase
 import logging
@@ -28,10 +36,50 @@ class MainApp(ProgresoBase):
         """
         super().__init__()
 
-        self.engine = asyncio.run(data.init_db())
+        # Perfil de SQLite (ver data.STORAGE_PROFILES): WAL para leer el histórico mientras un batch escribe
+        self.db_profile = "wal"
+        self.engine = asyncio.run(data.init_db(profile=self.db_profile))
         self.async_sessionmaker = data.sessionmaker(
             bind=self.engine, class_=data.AsyncSession, expire_on_commit=False
         )
+        # Páginas que el crawler carga en paralelo
+        self.crawler_workers = 4
+        # Orden de visita: con varios workers sólo "fifo" da el mismo resultado que el
+        # rastreo serial; "prioridad" prioriza dominios con cupo disponible
+        self.crawler_frontier = "fifo"
+        # Descarga por HTTP y usa el navegador sólo para páginas con JavaScript
+        self.crawler_http_first = True
+        # Bloquea imágenes, medios, fuentes, estilos y trackers en el navegador
+        self.crawler_block_resources = True
+        # Páginas rastreadas entre checkpoints del estado del crawler
+        self.checkpoint_every = 10
+        # Consultas simultáneas al modelo de lenguaje
+        self.oracle_concurrency = 8
+        # Envía cada sitio una sola vez con todas las consignas del batch
+        self.oracle_multi_prompt = True
+        # Caché de respuestas del modelo, junto a app.db
+        self.oracle_cache = dcCache("llm_cache.db")
+        # Límites de la cuenta (RPM/TPM) compartidos por todos los batches
+        self.oracle_rate_limiter = dcRateLimiter()
+        # Envía todas las consultas como un trabajo diferido del endpoint de batches
+        self.oracle_bulk = False
+        # Filas y segundos entre escrituras en bloque de sitios y respuestas
+        self.db_flush_rows = 50
+        self.db_flush_seconds = 2.0
+        # Filas por página al recorrer los sitios y respuestas de un batch
+        self.db_page_size = 500
+        # Segundos entre consultas del estado del trabajo diferido
+        self.oracle_bulk_poll = 30
+        # Contenido enviado por consulta: "caracteres" (recorte al rastrear, como antes),
+        # "truncate", "head_tail" o "map_reduce" (presupuesto en tokens del modelo)
+        self.content_strategy = "head_tail"
+        # Trozos por sitio como máximo con "map_reduce"
+        self.content_max_chunks = 4
+        # Tope de caracteres guardados por página cuando el recorte lo hace el presupuesto
+        self.content_max_page_chars = 100000
+        # Batches ejecutándose en este proceso (cada BatchConsole corre en su propio hilo)
+        self._en_ejecucion = set()
+        self._en_ejecucion_lock = threading.Lock()
 
     async def init_batch(self, batch: Batch):
         """
@@ -40,83 +88,554 @@ class MainApp(ProgresoBase):
         Args:
             batch (Batch): El objeto batch que contiene los parámetros para el rastreo.
         """
-        try:
-            self.notificar_progreso("Iniciando batch...")
-            # guardar el batch en la base de datos
-            async with self.async_sessionmaker() as session:
-                new_prompts = batch.new_prompts
-                batch = await data.create_batch(
-                    session,
-                    batch.url_inicial,
-                    batch.profundidad,
-                    batch.sitios,
-                    batch.caracteres,
-                )
-                batch_id = batch.id
+        self.notificar_progreso("Iniciando batch...")
+        # guardar el batch en la base de datos
+        async with self.async_sessionmaker() as session:
+            new_prompts = batch.new_prompts
+            batch = await data.create_batch(
+                session,
+                batch.url_inicial,
+                batch.profundidad,
+                batch.sitios,
+                batch.caracteres,
+            )
+            batch_id = batch.id
 
-                # guardar los prompts en la base de datos
-                for p in new_prompts:
-                    await data.create_batch_prompt(session, batch_id, p)
+            # guardar los prompts en la base de datos
+            await data.create_batch_prompts(session, batch_id, new_prompts)
 
-                self.notificar_progreso(
-                    f"Batch #{batch_id} guardado. Iniciando crawler..."
-                )
+            self.notificar_progreso(
+                f"Batch #{batch_id} guardado. Iniciando crawler..."
+            )
 
-                crawler = dcCrawler(
-                    batch.url_inicial, batch.profundidad, batch.caracteres, batch.sitios
-                )
-                crawler.registrar_notificador(self.notificar_progreso)
-                oracle = dcOracle()
+        await self.run_batch(batch_id)
 
-                await crawler.crawl_bfs()
-                #await crawler.crawl_recursive(batch.url_inicial, 0)
+    async def resume_batch(self, batch_id):
+        """
+        Reanuda un batch interrumpido desde su último checkpoint.
 
-                total_sites = len(crawler.visited)
-                analizar = len(crawler.analizar);
+        No vuelve a rastrear lo ya rastreado ni a consultar pares sitio/prompt
+        que ya tienen respuesta.
 
-                self.notificar_progreso(
-                    f"{total_sites} sitios encontrados. {analizar} para analizar. Obteniendo contenido..."
-                )
-                for index, url in enumerate(crawler.analizar, start=0):
-                    content = await crawler.fetch_page_content(url)
-                    await data.create_batch_site(session, batch_id, url, content)
+        Args:
+            batch_id (int): El ID del batch a reanudar.
+        """
+        self.notificar_progreso(f"Reanudando batch #{batch_id}...")
+        await self.run_batch(batch_id)
+
+    async def run_batch(self, batch_id):
+        """
+        Ejecuta (o continúa) las fases de un batch ya guardado: rastreo, contenido y análisis.
+
+        Un batch que ya se está ejecutando en este proceso no se vuelve a lanzar:
+        una segunda ejecución rastrearía de nuevo y chocaría con la primera al
+        guardar las mismas respuestas.
+
+        Args:
+            batch_id (int): El ID del batch a procesar.
+        """
+        with self._en_ejecucion_lock:
+            if batch_id in self._en_ejecucion:
+                self.notificar_progreso(f"El batch #{batch_id} ya se está ejecutando.")
+                return
+            self._en_ejecucion.add(batch_id)
+        try:
+            await self._run_batch(batch_id)
+        finally:
+            with self._en_ejecucion_lock:
+                self._en_ejecucion.discard(batch_id)
+
+    def is_running(self, batch_id):
+        """Si el batch se está ejecutando en este proceso."""
+        with self._en_ejecucion_lock:
+            return int(batch_id) in self._en_ejecucion
+
+    async def _run_batch(self, batch_id):
+        inicio = time.monotonic()
+        try:
+            async with self.async_sessionmaker() as session:
+                await data.update_batch_status(session, batch_id, "en_curso")
+                batch = await data.get_batch(session, batch_id)
+                fase, estado = await data.get_checkpoint(session, batch_id)
+
+                if fase in (None, "crawl", "contenido"):
+                    await self._crawl_fase(session, batch, fase, estado)
+                fallidas, rechazadas = await self._analisis_fase(session, batch_id)
+                if rechazadas:
                     self.notificar_progreso(
-                        f"{url} contenido guardado ({index + 1}/{analizar})"
+                        f"Batch #{batch_id}: {rechazadas} consultas rechazadas por el modelo "
+                        "se guardaron como error y no se reintentan."
                     )
 
-
-                sites = await data.get_batch_sites(session, batch_id)
-                prompts = await data.get_batch_prompts(session, batch_id)
-                # recorrer cada sitio y procesar con GPT
-                for index, site in enumerate(sites, start=0):
+                if fallidas:
+                    # El batch queda sin terminar para poder reanudarlo y reintentar
+                    await data.update_batch_status(
+                        session, batch_id, "error", time.monotonic() - inicio, errores=fallidas + rechazadas
+                    )
                     self.notificar_progreso(
-                        f"{site.url} procesando con GPT ({index+1}/{len(sites)})..."
+                        f"Batch #{batch_id}: {fallidas} consultas fallidas quedaron pendientes. "
+                        "Reanude el batch para reintentarlas."
                     )
-                    for prompt in prompts:
-                        response = oracle.process_web(site.contenido, prompt.prompt)
-                        await data.create_batch_prompt_response(
-                            session, batch_id, site.id, prompt.id, response
-                        )
-                        self.notificar_progreso(f"P: {prompt.prompt}\nR: {response}")
-
-                await data.update_batch(session, batch_id, fecha_terminado=datetime.now())
+                    return
+
+                await data.save_checkpoint(session, batch_id, "terminado")
+                await data.update_batch_status(
+                    session, batch_id, "completado", time.monotonic() - inicio,
+                    errores=rechazadas, fecha_terminado=datetime.now(),
+                )
                 self.notificar_progreso(f"Batch #{batch_id} finalizado!")
         except asyncio.CancelledError:
+            # Cancelado queda pendiente: se puede reanudar
+            await self._guardar_estado(batch_id, "pendiente", inicio)
             self.notificar_progreso("Batch cancelado.")
             raise
         except Exception as e:
+            await self._guardar_estado(batch_id, "error", inicio)
             self.notificar_progreso(f"Error: {e}")
             raise
 
-    async def get_batches_historicos(self):
+    async def _guardar_estado(self, batch_id, estado, inicio):
+        """Guarda el estado de una ejecución interrumpida, en una sesión nueva."""
+        async with self.async_sessionmaker() as session:
+            await data.update_batch_status(session, batch_id, estado, time.monotonic() - inicio)
+
+    async def _crawl_fase(self, session, batch: Batch, fase, estado):
+        """Rastrea (o reanuda el rastreo) y guarda el contenido de los sitios a analizar."""
+        batch_id = batch.id
+
+        async def checkpoint(estado_crawler):
+            await data.save_checkpoint(session, batch_id, "crawl", estado_crawler)
+
+        # Los textos capturados van al almacén comprimido; el checkpoint sólo lleva sus hashes
+        async def guardar_contenidos(textos):
+            hashes = await data.put_contents(session, textos)
+            await session.commit()
+            return hashes
+
+        # El crawler mantiene un único navegador para todo el batch
+        resource_policy = ResourcePolicy() if self.crawler_block_resources else None
+        async with dcCrawler(
+            batch.url_inicial, batch.profundidad, self._caracteres_rastreo(batch), batch.sitios,
+            workers=self.crawler_workers, capture_content=True,
+            frontier=self.crawler_frontier, http_first=self.crawler_http_first,
+            resource_policy=resource_policy,
+        ) as crawler:
+            crawler.registrar_notificador(self.notificar_progreso)
+            crawler.registrar_checkpoint(checkpoint, self.checkpoint_every)
+            crawler.registrar_almacen(guardar_contenidos)
+            if estado is not None:
+                crawler.restore_state(estado)
+
+            if fase != "contenido":
+                try:
+                    await crawler.crawl_bfs()
+                    #await crawler.crawl_recursive(batch.url_inicial, 0)
+                except asyncio.CancelledError:
+                    # La cancelación puede llegar a mitad de un flush: se descarta antes de guardar
+                    await session.rollback()
+                    await crawler.guardar_contenidos()
+                    await checkpoint(crawler.export_state())
+                    raise
+                await data.save_checkpoint(session, batch_id, "contenido", crawler.export_state())
+
+            if resource_policy is not None:
+                self.notificar_progreso(
+                    f"{resource_policy.bloqueados} solicitudes bloqueadas {resource_policy.por_tipo}"
+                )
+
+            total_sites = len(crawler.visited)
+            analizar = len(crawler.analizar);
+
+            # Al reanudar no se vuelven a guardar los sitios que ya tienen contenido;
+            # los textos se leen de a una página para armar las huellas
+            guardados = set()
+            detector = DetectorDuplicados()
+            after_id = None
+            while sites := await data.get_batch_sites_page(session, batch_id, after_id, self.db_page_size):
+                guardados.update(site.url for site in sites)
+                canonicos = [site for site in sites if site.duplicado_de is None]
+                textos = await data.get_site_texts(session, canonicos)
+                for site in canonicos:
+                    if textos[site.id]:
+                        detector.agregar(detector.huella(textos[site.id]), site.id)
+                after_id = sites[-1].id
+
+            capturados = len(crawler.analizar & (crawler.contenidos.keys() | crawler.claves_contenido.keys()))
+            self.notificar_progreso(
+                f"{total_sites} sitios encontrados. {analizar} para analizar "
+                f"({capturados} ya capturados, {len(guardados)} ya guardados). Obteniendo contenido..."
+            )
+            async with self._writer(session, batch_id) as writer:
+                for index, url in enumerate(sorted(crawler.analizar), start=0):
+                    if url in guardados:
+                        continue
+                    # Sólo se vuelven a cargar las URLs que el rastreo no renderizó
+                    if url in crawler.contenidos:
+                        content = crawler.contenidos[url]
+                    elif url in crawler.claves_contenido:
+                        clave = crawler.claves_contenido[url]
+                        content = (await data.get_contents(session, [clave])).get(clave)
+                    else:
+                        content = await crawler.fetch_page_content(url)
+
+                    # El detector guarda ids de sitios ya escritos o filas todavía en el buffer
+                    huella = canonico = None
+                    if content:
+                        huella = detector.huella(content)
+                        canonico = detector.buscar(huella)
+                    site = await writer.add_site(
+                        url, content,
+                        hash_contenido=huella.exacta if huella else None,
+                        duplicado_de=canonico,
+                    )
+                    if huella and canonico is None:
+                        detector.agregar(huella, site)
+
+                    # add_site escribe el buffer antes de un duplicado, así que el canónico ya tiene id
+                    duplicado = f", duplicado del sitio #{getattr(canonico, 'id', canonico)}" if canonico else ""
+                    self.notificar_progreso(
+                        f"{url} contenido obtenido ({index + 1}/{analizar}{duplicado})"
+                    )
+
+        await data.save_checkpoint(session, batch_id, "analisis")
+
+    async def _analisis_fase(self, session, batch_id):
         """
-        Recupera todos los batches históricos de la base de datos.
-        
+        Procesa con GPT los pares sitio/prompt que todavía no tienen respuesta.
+
+        Returns:
+            tuple: (fallidas, rechazadas), ver `_analizar_con_writer`.
+        """
+        if self.oracle_bulk:
+            oracle = await self._crear_oracle_bulk(session, batch_id)
+        else:
+            oracle = dcOracle(self.oracle_concurrency, self.oracle_cache, self.oracle_rate_limiter)
+        oracle.budget = await self._crear_budget(session, batch_id, oracle.engine)
+        inicio = time.monotonic()
+        try:
+            fallidas, rechazadas = await self._analizar_pendientes(session, batch_id, oracle)
+            if self.oracle_bulk:
+                # El trabajo ya se ingirió: al reanudar se envían sólo los pares pendientes
+                await data.save_checkpoint(session, batch_id, "analisis")
+        except asyncio.CancelledError:
+            await session.rollback()
+            await self._guardar_uso(session, batch_id, oracle, inicio)
+            raise
+        finally:
+            await oracle.close()
+        await self._guardar_uso(session, batch_id, oracle, inicio)
+        self.notificar_progreso(self.oracle_cache.stats())
+        return fallidas, rechazadas
+
+    async def _guardar_uso(self, session, batch_id, oracle: dcOracle, inicio):
+        """Suma al batch los tokens y el tiempo de esta ejecución del análisis."""
+        uso = oracle.uso_total
+        batch = await data.add_batch_usage(
+            session, batch_id, uso.consultas, uso.prompt, uso.cached, uso.completion,
+            time.monotonic() - inicio,
+        )
+        self.notificar_progreso(
+            f"{uso.consultas} consultas, {uso.prompt} tokens de entrada ({uso.cached} en caché), "
+            f"{uso.completion} de salida. Total del batch: {batch.tokens_prompt + batch.tokens_completion} tokens."
+        )
+
+    def _sin_costo(self, response):
+        """La respuesta reutilizada para un sitio duplicado: mismo texto y modelo, uso cero."""
+        if isinstance(response, OracleError):
+            return response
+        return Respuesta(response, modelo=getattr(response, "modelo", None))
+
+    def _caracteres_rastreo(self, batch):
+        """Caracteres que guarda el crawler por página según la estrategia de contenido."""
+        if self.content_strategy == "caracteres":
+            return batch.caracteres
+        return self.content_max_page_chars
+
+    async def _crear_budget(self, session, batch_id, engine):
+        """
+        Presupuesto de tokens por consulta: los caracteres del batch convertidos a
+        tokens del modelo. None con la estrategia "caracteres" (ya recortó el crawler).
+        """
+        if self.content_strategy == "caracteres":
+            return None
+        batch = await data.get_batch(session, batch_id)
+        return ContentBudget(
+            engine,
+            max_tokens=max(1, (batch.caracteres or 5000) // CHARS_POR_TOKEN),
+            strategy=self.content_strategy,
+            max_chunks=self.content_max_chunks,
+        )
+
+    async def _crear_oracle_bulk(self, session, batch_id):
+        """Crea el oráculo diferido; si el batch ya tenía un trabajo enviado, lo retoma."""
+        oracle = dcOracleBulk(self.oracle_cache, self.oracle_bulk_poll)
+        oracle.registrar_notificador(self.notificar_progreso)
+
+        async def guardar_envio(bulk_id):
+            await data.save_checkpoint(session, batch_id, "analisis", {"bulk_id": bulk_id})
+
+        oracle.registrar_envio(guardar_envio)
+        fase, estado = await data.get_checkpoint(session, batch_id)
+        if fase == "analisis" and estado and estado.get("bulk_id"):
+            oracle.bulk_id = estado["bulk_id"]
+            self.notificar_progreso(f"Retomando el trabajo {oracle.bulk_id}...")
+        return oracle
+
+    async def _analizar_pendientes(self, session, batch_id, oracle: dcOracle):
+
+        prompts = await data.get_batch_prompts(session, batch_id)
+        # (sitio, prompt) -> id de la respuesta guardada; sin el texto, que sólo hace falta para duplicados
+        guardadas = {}
+        con_error = set()
+        async for r in data.stream_batch_responses(session, batch_id, self.db_page_size):
+            guardadas[(r.batch_site_id, r.batch_prompt_id)] = r.id
+            if r.error:
+                con_error.add((r.batch_site_id, r.batch_prompt_id))
+        if guardadas:
+            self.notificar_progreso(
+                f"{len(guardadas)} respuestas ya guardadas ({len(con_error)} con error), se omiten."
+            )
+
+        # Los duplicados esperan la respuesta de su sitio canónico
+        duplicados = {}
+        pendientes = []
+        async for site in data.stream_batch_sites(session, batch_id, self.db_page_size):
+            for prompt in prompts:
+                if (site.id, prompt.id) in guardadas:
+                    continue
+                if site.duplicado_de is not None:
+                    duplicados.setdefault((site.duplicado_de, prompt.id), []).append(site)
+                else:
+                    pendientes.append((site, prompt))
+
+        # (sitio, prompt) -> respuesta, con el texto de las que se reutilizan en duplicados pendientes
+        textos_guardados = await data.get_response_texts(
+            session, [guardadas[clave] for clave in duplicados if clave in guardadas]
+        )
+        respuestas = {clave: textos_guardados.get(response_id) for clave, response_id in guardadas.items()}
+        for clave in con_error:
+            respuestas[clave] = OracleError(respuestas[clave], False)
+
+        async with self._writer(session, batch_id) as writer:
+            return await self._analizar_con_writer(
+                session, writer, oracle, prompts, respuestas, duplicados, pendientes
+            )
+
+    async def _con_textos(self, session, items):
+        """
+        Agrega a cada (sitio, x) el texto del sitio, leído (y descomprimido) de a una
+        página de `db_page_size` a medida que el oráculo pide más consultas.
+
+        Yields:
+            tuple: (sitio, x, texto).
+        """
+        for inicio in range(0, len(items), self.db_page_size):
+            pagina = items[inicio:inicio + self.db_page_size]
+            textos = await data.get_site_texts(session, {site.id: site for site, _ in pagina}.values())
+            for site, x in pagina:
+                yield site, x, textos[site.id]
+
+    def _writer(self, session, batch_id):
+        return data.BatchWriter(session, batch_id, self.db_flush_rows, self.db_flush_seconds)
+
+    async def _analizar_con_writer(self, session, writer, oracle: dcOracle, prompts, respuestas, duplicados, pendientes):
+        """
+        Consulta los pares pendientes y encola las respuestas (y las de sus duplicados) en `writer`.
+
+        Returns:
+            tuple: (fallidas, rechazadas): consultas con error reintentable, que quedan
+                pendientes, y con error no reintentable, que se guardan marcadas como error.
+        """
+        total = len(pendientes) + sum(len(d) for d in duplicados.values())
+        hechos = 0
+        fallidas = 0
+        rechazadas = 0
+
+        async def guardar(site, prompt, response):
+            nonlocal hechos
+            respuestas[(site.id, prompt.id)] = response
+            uso = getattr(response, "uso", None)
+            await writer.add_response(
+                site.id, prompt.id, str(response),
+                error=isinstance(response, OracleError),
+                modelo=getattr(response, "modelo", None),
+                tokens_prompt=uso.prompt if uso else 0,
+                tokens_cached=uso.cached if uso else 0,
+                tokens_completion=uso.completion if uso else 0,
+                latencia=getattr(response, "latencia", None),
+            )
+            hechos += 1
+            self.notificar_progreso(f"{site.url} ({hechos}/{total})\nP: {prompt.prompt}\nR: {response}")
+
+        # Duplicados cuyo canónico ya tenía respuesta de una ejecución anterior
+        for (canonico_id, prompt_id), sitios_dup in list(duplicados.items()):
+            if (canonico_id, prompt_id) in respuestas:
+                prompt = next(p for p in prompts if p.id == prompt_id)
+                for site in duplicados.pop((canonico_id, prompt_id)):
+                    await guardar(site, prompt, self._sin_costo(respuestas[(canonico_id, prompt_id)]))
+
+        async def guardar_con_duplicados(site, prompt, response):
+            nonlocal fallidas, rechazadas
+            if isinstance(response, OracleError) and response.reintentable:
+                # No se guarda: el par (y sus duplicados) queda para reintentar al reanudar
+                fallidas += 1 + len(duplicados.pop((site.id, prompt.id), []))
+                self.notificar_progreso(f"{site.url}\nP: {prompt.prompt}\nError (reintentable): {response}")
+                return
+            if isinstance(response, OracleError):
+                # Reenviarlo fallaría igual: se guarda marcado como error y no bloquea el batch
+                rechazadas += 1 + len(duplicados.get((site.id, prompt.id), []))
+            await guardar(site, prompt, response)
+            for duplicado in duplicados.pop((site.id, prompt.id), []):
+                await guardar(duplicado, prompt, self._sin_costo(response))
+
+        if self.oracle_multi_prompt:
+            # Un único envío del contenido por sitio con todas sus consignas pendientes
+            por_sitio = {}
+            for site, prompt in pendientes:
+                por_sitio.setdefault(site.id, (site, []))[1].append(prompt)
+            self.notificar_progreso(
+                f"Procesando {len(pendientes)} consultas con GPT en {len(por_sitio)} envíos..."
+            )
+            items = (
+                ((site, site_prompts), contenido, [(p.id, p.prompt) for p in site_prompts])
+                async for site, site_prompts, contenido in self._con_textos(session, list(por_sitio.values()))
+            )
+            async for (site, site_prompts), por_prompt in oracle.process_batch_multi(items):
+                for prompt in site_prompts:
+                    await guardar_con_duplicados(site, prompt, por_prompt[prompt.id])
+        else:
+            self.notificar_progreso(f"Procesando {len(pendientes)} consultas con GPT...")
+            items = (
+                ((site, prompt), contenido, prompt.prompt)
+                async for site, prompt, contenido in self._con_textos(session, pendientes)
+            )
+            async for (site, prompt), response in oracle.process_batch(items):
+                await guardar_con_duplicados(site, prompt, response)
+
+        return fallidas, rechazadas
+
+    async def get_batches_historicos(self, before_id=None, limit=100):
+        """
+        Recupera una página de los batches históricos, del más nuevo al más viejo.
+
+        Args:
+            before_id (int): Id del último batch de la página anterior (None para la primera).
+            limit (int): Batches por página.
+
+        Returns:
+            list: Filas con las columnas de data.COLUMNAS_BATCH.
+        """
+        async with self.async_sessionmaker() as session:
+            return await data.get_batches_page(session, before_id, limit)
+
+    async def get_batch_sites_page(self, batch_id, after_id=None, limit=None):
+        """
+        Recupera una página de los sitios de un batch, sin su texto (ver get_site_texts).
+
+        Args:
+            batch_id (int): El ID del batch.
+            after_id (int): Id del último sitio de la página anterior (None para la primera).
+            limit (int): Sitios por página; por defecto `db_page_size`.
+
+        Returns:
+            list: Filas con las columnas de data.COLUMNAS_SITIO.
+        """
+        async with self.async_sessionmaker() as session:
+            return await data.get_batch_sites_page(session, batch_id, after_id, limit or self.db_page_size)
+
+    async def get_batch_prompts(self, batch_id):
+        """
+        Recupera los prompts de un batch.
+
+        Args:
+            batch_id (int): El ID del batch.
+
+        Returns:
+            List[BatchPrompt]: Los prompts del batch.
+        """
+        async with self.async_sessionmaker() as session:
+            return await data.get_batch_prompts(session, batch_id)
+
+    async def get_site_responses(self, site_ids):
+        """
+        Recupera las respuestas (con su texto) de los sitios dados.
+
+        Args:
+            site_ids (list): Ids de los sitios, por ejemplo los de una página.
+
+        Returns:
+            list: Filas con las columnas de data.COLUMNAS_RESPUESTA y `respuesta`.
+        """
+        async with self.async_sessionmaker() as session:
+            return await data.get_site_responses(session, site_ids)
+
+    async def get_response_stats(self, batch_id):
+        """
+        Recupera el resumen del uso por respuesta de un batch (ver data.get_response_stats).
+
+        Args:
+            batch_id (int): El ID del batch.
+
+        Returns:
+            dict: Cantidades y promedios de las respuestas del batch.
+        """
+        async with self.async_sessionmaker() as session:
+            return await data.get_response_stats(session, batch_id)
+
+    async def get_site_texts(self, sites):
+        """
+        Recupera el texto (descomprimido) de los sitios dados.
+
+        Args:
+            sites (List[BatchSite]): Los sitios cuyo texto se quiere mostrar.
+
+        Returns:
+            dict: id del sitio -> texto.
+        """
+        async with self.async_sessionmaker() as session:
+            return await data.get_site_texts(session, sites)
+
+    async def search(self, consulta, limite=50):
+        """
+        Busca un texto en el contenido de los sitios y en las respuestas de todos los batches.
+
+        Args:
+            consulta (str): Las palabras a buscar.
+            limite (int): Máximo de resultados de cada grupo.
+
+        Returns:
+            dict: "sitio" y "respuesta" -> List[ResultadoBusqueda], cada grupo ordenado
+                por su relevancia, con un fragmento marcado.
+        """
+        async with self.async_sessionmaker() as session:
+            return await data.search(session, consulta, limite)
+
+    async def compact_storage(self, train_dictionary=True):
+        """
+        Compacta la base: pasa al almacén comprimido los textos de versiones
+        anteriores, entrena un diccionario zstd (si está disponible), recomprime
+        lo guardado con él y libera el espacio con VACUUM.
+
         Returns:
-            List[Batch]: Una lista de todos los batches históricos.
+            tuple: (migrados, recomprimidos), o None si hay batches ejecutándose
+                (VACUUM necesita la base sin otras transacciones abiertas).
         """
+        with self._en_ejecucion_lock:
+            if self._en_ejecucion:
+                self.notificar_progreso("Hay batches en ejecución; la base no se compacta.")
+                return None
+        recomprimidos = 0
         async with self.async_sessionmaker() as session:
-            return await data.get_batches(session)
+            migrados = await data.migrate_site_contents(session)
+            self.notificar_progreso(f"{migrados} sitios pasados al almacén comprimido.")
+            if train_dictionary and await data.train_content_dictionary(session) is not None:
+                recomprimidos = await data.recompress_contents(session)
+                self.notificar_progreso(f"Diccionario entrenado; {recomprimidos} textos recomprimidos.")
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(data.text("VACUUM"))
+        self.notificar_progreso("Base compactada.")
+        return migrados, recomprimidos
 
     async def get_batch_by_id(self, batch_id, eagger=False):
         """
@@ -124,7 +643,7 @@ class MainApp(ProgresoBase):
         
         Args:
             batch_id (int): El ID del batch a recuperar.
-            eagger (bool): Si se deben cargar los datos relacionados de forma anticipada.
+            eagger (bool): Si también se cargan los prompts (los sitios se leen con get_batch_sites_page).
         
         Returns:
             Batch: El objeto batch con el ID especificado.